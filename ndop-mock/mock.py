@@ -321,3 +321,21 @@ def put_state_model_endpoint(session_cookie, resp):
     state_model_json = request.get_json(force=True)
     print(f'put_state_model_endpoint: {state_model_json}')
     return resp
+
+
+# Set STATE_MODEL_RESET_SUPPORTED=False to emulate a backend without the reset
+# function, so the read then write fallback can be compared against it
+STATE_MODEL_RESET_SUPPORTED = os.environ.get('STATE_MODEL_RESET_SUPPORTED', 'True').lower() in ('true', '1')
+
+
+@app.route("/reset-state-model", methods=["POST"])
+@cookies.check_cookies
+def reset_state_model_endpoint(session_cookie, resp):
+    if not STATE_MODEL_RESET_SUPPORTED:
+        resp.status_code = 404
+        return resp
+
+    reset_json = request.get_json(force=True)
+    print(f'reset_state_model_endpoint: {reset_json}')
+    resp.set_data(json.dumps({"session_id": reset_json["session_id"], "kept": reset_json.get("keep", [])}))
+    return resp
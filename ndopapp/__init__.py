@@ -1,7 +1,19 @@
+from ndopapp import coldstart
 from flask import Flask, template_rendered, request_started, request, current_app
-from .logging import install_logger
-from ndopapp import routes
+from .logging import install_logger, flush_logs, emf
+from ndopapp import routes, concurrency, deadline, servertiming, tracing, logsummary
 from ndopapp.csrf import csrf
+from ndopapp.client import api_client
+from ndopapp.cache import session_cache
+from ndopapp.circuitbreaker import breakers
+from ndopapp.retry import retry_budget
+from ndopapp.hedging import hedger
+from ndopapp.statemodel import state_model
+from ndopapp.metrics import latency_metrics
+from ndopapp.pagecache import page_cache
+from ndopapp.exceptionlog import exception_log
+
+coldstart.mark("imports")
 
 
 def log_request(sender, **extra):
@@ -18,21 +30,77 @@ def log_template(sender, template, **extra):
 
 
 def create_app(object_name):
+    coldstart.begin()
     install_logger()
+    coldstart.mark("logging")
 
     app = Flask(__name__)
     app.config.from_object(object_name)
+    coldstart.mark("config")
 
     # Per request logging
     request_started.connect(log_request, app)
     template_rendered.connect(log_template, app)
+    app.teardown_request(flush_logs)
+
+    # Latency histograms of controllers and backend calls
+    latency_metrics.init_app(app)
+
+    # Optional Server-Timing breakdown of each response
+    servertiming.init_app(app)
+
+    # Optional tracing of controllers and the backend calls they make
+    tracing.init_app(app)
+
+    # Optional one line summary of each request in place of its info lines
+    logsummary.init_app(app)
+
+    # Full logging of the first of each kind of exception, counts of the rest
+    exception_log.init_app(app)
+
+    # Optional CloudWatch embedded metrics, one line per request
+    emf.init_app(app)
+
+    # Time budget shared by every backend call a request makes
+    deadline.init_app(app)
 
     # CSRF protection
     csrf.init_app(app)
 
+    # Keep-alive connection pool to the NDOP API
+    api_client.init_app(app)
+
+    # Circuit breakers for each NDOP API endpoint
+    breakers.init_app(app)
+
+    # Process wide cap on retried backend calls
+    retry_budget.init_app(app)
+
+    # Optional hedging of slow, latency critical polls
+    hedger.init_app(app)
+
+    # State model lambdas, or the mock's state model endpoints
+    state_model.init_app(app)
+
+    # Short lived cache of /checksession results
+    session_cache.init_app(app)
+
+    # Worker pool for concurrent backend calls within a request
+    concurrency.init_app(app)
+
+    # Pre-rendered pages, rendered again for each app's config
+    page_cache.init_app(app)
+
+    # Counters of the backend call machinery, reported with the latency summaries
+    latency_metrics.add_stats('single_flight', api_client.in_flight)
+    latency_metrics.add_stats('session_cache', session_cache)
+    latency_metrics.add_stats('retry_budget', retry_budget)
+    latency_metrics.add_stats('hedging', hedger)
+
     routes.prefix = app.config.get('URL_PREFIX')
     routes.host = app.config.get('CLIENT_FACING_URL').strip('/')
     app.routes = routes
+    coldstart.mark("extensions")
 
     from .main import create_module as main_create_module
     from .yourdetails import create_module as yourdetails_create_module
@@ -41,5 +109,9 @@ def create_app(object_name):
     main_create_module(app)
     yourdetails_create_module(app)
     verification_create_module(app)
+    coldstart.mark("blueprints")
+
+    # Once per process, on the cold start
+    coldstart.log_report()
 
     return app
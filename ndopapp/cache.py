@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded, thread safe LRU cache where every entry expires after its own ttl"""
+
+    def __init__(self, maxsize=1024, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+
+        with self.lock:
+            self.entries[key] = (value, self.clock() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class SessionValidityCache(TTLCache):
+    """Results of /checksession keyed by session id
+
+    Valid sessions are only trusted for a short time, invalid ones are kept
+    longer so clients holding dead cookies stop reaching the backend.
+    """
+
+    def __init__(self, maxsize=1024, valid_ttl=10, invalid_ttl=60):
+        super().__init__(maxsize)
+        self.valid_ttl = valid_ttl
+        self.invalid_ttl = invalid_ttl
+
+    def init_app(self, app):
+        self.maxsize = app.config.get("SESSION_CACHE_MAXSIZE", self.maxsize)
+        self.valid_ttl = app.config.get("SESSION_CACHE_TTL", self.valid_ttl)
+        self.invalid_ttl = app.config.get("SESSION_CACHE_INVALID_TTL", self.invalid_ttl)
+        self.clear()
+
+    def put(self, session_id, valid):
+        self.set(session_id, valid, self.valid_ttl if valid else self.invalid_ttl)
+
+
+session_cache = SessionValidityCache()
@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from ndopapp.models import NDOP_ServiceUnavailableError
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+logger = logging.getLogger("flask.app")
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint while it keeps failing or answering slowly
+
+    Closed, every call is made and its outcome recorded over a rolling window of
+    calls. Once enough of the window failed or was slow the breaker opens, and calls
+    fail straight away for open_seconds. After that the breaker is half open and
+    lets a single trial call through, closing again if it succeeds and reopening
+    if it does not.
+
+    Each change of state starts a new generation. A call's outcome is only recorded
+    if it started in the current generation, so calls made before the breaker
+    opened, or before the trial, can't decide the state it is in now.
+    """
+
+    def __init__(self, name, window=20, minimum_calls=10, error_rate=0.5,
+                 slow_call_seconds=5, slow_call_rate=0.8, open_seconds=30, clock=time.monotonic):
+        self.name = name
+        self.minimum_calls = minimum_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.outcomes = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.generation = 0
+
+    def before_call(self):
+        """Raises NDOP_ServiceUnavailableError if the call should not be made
+
+        Returns:
+            int: The generation the call is made in, to be passed to after_call
+        """
+        with self.lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self.trial_in_flight = False
+                self.generation += 1
+
+            if self.state == OPEN or (self.state == HALF_OPEN and self.trial_in_flight):
+                raise NDOP_ServiceUnavailableError(f"circuit open for {self.name}")
+
+            if self.state == HALF_OPEN:
+                self.trial_in_flight = True
+            return self.generation
+
+    def after_call(self, failed, seconds, generation):
+        """Records the outcome of a call allowed by before_call"""
+        slow = seconds >= self.slow_call_seconds
+
+        with self.lock:
+            if generation != self.generation:
+                return
+
+            if self.state == HALF_OPEN:
+                self.trial_in_flight = False
+                if failed or slow:
+                    self.open()
+                else:
+                    self.close()
+                return
+
+            self.outcomes.append((failed, slow))
+            if len(self.outcomes) < self.minimum_calls:
+                return
+
+            errors = sum(1 for failed, _ in self.outcomes if failed) / len(self.outcomes)
+            slow_calls = sum(1 for _, slow in self.outcomes if slow) / len(self.outcomes)
+            if errors >= self.error_rate or slow_calls >= self.slow_call_rate:
+                self.open()
+
+    def open(self):
+        if self.state != OPEN:
+            logger.warning("circuit breaker opened", {'endpoint': self.name, 'calls': len(self.outcomes)})
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.outcomes.clear()
+        self.generation += 1
+
+    def close(self):
+        logger.info("circuit breaker closed", {'endpoint': self.name})
+        self.state = CLOSED
+        self.outcomes.clear()
+        self.generation += 1
+
+
+class CircuitBreakers:
+    """A circuit breaker for each NDOP API endpoint, created on first use"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.breakers = {}
+        self.settings = {}
+
+    def init_app(self, app):
+        with self.lock:
+            self.breakers.clear()
+            self.settings = {
+                'window': app.config.get("BREAKER_WINDOW", 20),
+                'minimum_calls': app.config.get("BREAKER_MINIMUM_CALLS", 10),
+                'error_rate': app.config.get("BREAKER_ERROR_RATE", 0.5),
+                'slow_call_seconds': app.config.get("BREAKER_SLOW_CALL_SECONDS", 5),
+                'slow_call_rate': app.config.get("BREAKER_SLOW_CALL_RATE", 0.8),
+                'open_seconds': app.config.get("BREAKER_OPEN_SECONDS", 30),
+            }
+
+    def get(self, endpoint):
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            with self.lock:
+                breaker = self.breakers.setdefault(endpoint, CircuitBreaker(endpoint, **self.settings))
+        return breaker
+
+    def states(self):
+        return {endpoint: breaker.state for endpoint, breaker in self.breakers.items()}
+
+
+breakers = CircuitBreakers()
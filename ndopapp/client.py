@@ -0,0 +1,148 @@
+import functools
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from flask import g, has_app_context
+from requests.adapters import HTTPAdapter
+
+from ndopapp import deadline, servertiming, tracing
+from ndopapp.circuitbreaker import breakers
+from ndopapp.hedging import hedger
+from ndopapp.metrics import latency_metrics, outcome_of
+from ndopapp.models import NDOP_SessionExpiredError
+from ndopapp.retry import call_with_retries
+from ndopapp.singleflight import SingleFlight
+
+
+JSON_HEADERS = {"Content-type": "application/json"}
+ACCEPT_JSON_HEADERS = {"Accept": "application/json"}
+
+# Statuses the API answers with when it rejects a session cookie, minus the ones
+# an endpoint already uses to report a result of its own
+SESSION_REJECTED_STATUSES = {
+    "patientsearchresult": (403,),  # 401 is a failed lookup
+    "getpreferenceresult": (403,),  # 401 is a failed preference lookup
+    "storepreferencesresult": (403,),  # 401 is a failed store
+    "setpreferences": (401,),  # 403 is an invalid preference
+    "verifycode": (),  # 401 and 403 are expired and incorrect codes
+}
+DEFAULT_SESSION_REJECTED_STATUSES = (401, 403)
+
+# Polled, read only endpoints where concurrent GETs for the same session (double
+# clicks, several open tabs) share one in flight call to the API
+SHARED_ENDPOINTS = ("patientsearchresult", "storepreferencesresult", "checksession")
+
+# Latency critical GETs that may be hedged, see hedging.Hedger
+HEDGED_ENDPOINTS = ("patientsearchresult", "checksession")
+
+
+def endpoint_name(url):
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+class NdopApiClient:
+    """Process wide client for the NDOP API
+
+    All backend calls share one requests.Session, so TCP connections (and TLS
+    sessions) are kept alive and reused between calls, requests and warm lambda
+    invocations instead of being opened for every call.
+    """
+
+    def __init__(self, pool_connections=1, pool_maxsize=10):
+        self.session = self.build_session(pool_connections, pool_maxsize)
+        self.in_flight = SingleFlight()
+
+    def init_app(self, app):
+        self.session = self.build_session(
+            app.config.get("API_POOL_CONNECTIONS", 1),
+            app.config.get("API_POOL_MAXSIZE", 10),
+        )
+        self.in_flight.clear()
+
+    @staticmethod
+    def build_session(pool_connections, pool_maxsize):
+        session = requests.Session()
+
+        # session_id cookies belong to a single user so the shared cookie jar
+        # must never keep them, they are passed explicitly on every call
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @staticmethod
+    def cookies_for(session_id):
+        if not session_id:
+            return None
+        return {"session_id": session_id}
+
+    def get(self, url, session_id=None, headers=JSON_HEADERS, **kwargs):
+        return self.request("GET", url, session_id, headers=headers, **kwargs)
+
+    def post(self, url, data, session_id=None, headers=JSON_HEADERS, **kwargs):
+        return self.request("POST", url, session_id, headers=headers, data=data, **kwargs)
+
+    def request(self, method, url, session_id=None, retry=False, **kwargs):
+        """Makes a call to the API
+
+        Args:
+            retry (bool): Retry connection and gateway errors, only for idempotent GETs
+        """
+        endpoint = endpoint_name(url)
+        if retry and method == "GET":
+            response = call_with_retries(functools.partial(self.attempt, method, url, session_id, **kwargs), endpoint)
+        else:
+            response = self.attempt(method, url, session_id, **kwargs)
+
+        if has_app_context() and g.get("optimistic_session_check"):
+            rejected = SESSION_REJECTED_STATUSES.get(endpoint, DEFAULT_SESSION_REJECTED_STATUSES)
+            if response.status_code in rejected:
+                raise NDOP_SessionExpiredError(f"session rejected by {endpoint}")
+
+        return response
+
+    def attempt(self, method, url, session_id=None, **kwargs):
+        endpoint = endpoint_name(url)
+        kwargs["timeout"] = deadline.timeout_for(endpoint, kwargs.get("timeout"))
+
+        send = functools.partial(self.send, method, url, session_id, **kwargs)
+        if method == "GET" and endpoint in HEDGED_ENDPOINTS:
+            send = functools.partial(hedger.call, endpoint, send)
+
+        if method == "GET" and session_id and endpoint in SHARED_ENDPOINTS:
+            return self.in_flight.do((endpoint, session_id), send)
+        return send()
+
+    def send(self, method, url, session_id=None, **kwargs):
+        endpoint = endpoint_name(url)
+        breaker = breakers.get(endpoint)
+        generation = breaker.before_call()
+
+        span = tracing.start_span("api", endpoint)
+        if span is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **span.headers()}
+
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, url, cookies=self.cookies_for(session_id), **kwargs)
+        except Exception as e:
+            self.observe(breaker, generation, endpoint, started, span, failed=True, outcome=outcome_of(exception=e))
+            raise
+
+        self.observe(breaker, generation, endpoint, started, span, failed=response.status_code >= 500,
+                     outcome=outcome_of(response.status_code))
+        return response
+
+    @staticmethod
+    def observe(breaker, generation, endpoint, started, span, failed, outcome):
+        seconds = time.monotonic() - started
+        breaker.after_call(failed=failed, seconds=seconds, generation=generation)
+        latency_metrics.observe("api", endpoint, outcome, seconds)
+        servertiming.record(f"api-{endpoint}", seconds)
+        tracing.finish_span(span, outcome)
+
+
+api_client = NdopApiClient()
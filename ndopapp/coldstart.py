@@ -0,0 +1,100 @@
+"""Where a cold start's time goes, by phase of importing ndopapp and create_app
+
+The phases are logged as a "cold start" line by the first create_app in each
+process. scripts/coldstart_report.py prints them, with the time taken importing
+each package as python -X importtime would, for a fresh process.
+"""
+import builtins
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger("flask.app")
+
+# Phases of this process's first ndopapp import and create_app, in order
+phases = OrderedDict()
+# Seconds spent importing each top level package, only filled in while profiling
+import_times = OrderedDict()
+reported = False
+
+# Where the phase being timed started
+phase_started = time.perf_counter()
+phase_modules = len(sys.modules)
+
+
+def begin():
+    """Starts timing the next phase from now"""
+    global phase_started, phase_modules
+    phase_started = time.perf_counter()
+    phase_modules = len(sys.modules)
+
+
+def mark(name):
+    """Ends a phase, recording it the first time it ends in the process, and begins the next"""
+    if name not in phases:
+        phases[name] = {
+            'seconds': time.perf_counter() - phase_started,
+            'modules_imported': len(sys.modules) - phase_modules,
+        }
+    begin()
+
+
+def report():
+    return [
+        {'phase': name, 'ms': round(timing['seconds'] * 1000, 1), 'modules_imported': timing['modules_imported']}
+        for name, timing in phases.items()
+    ]
+
+
+def total_seconds():
+    return sum(timing['seconds'] for timing in phases.values())
+
+
+def log_report():
+    """Logs the cold start's phases, once per process"""
+    global reported
+    if reported:
+        return
+    reported = True
+    logger.info("cold start", {'total_ms': round(total_seconds() * 1000, 1), 'phases': report()})
+
+
+def profile_imports():
+    """Adds up the time taken importing each top level package for the first time, from now on"""
+    original_import = builtins.__import__
+    importing = []
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        package = name.partition('.')[0]
+        if level or importing or package == __package__ or name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+
+        importing.append(package)
+        started = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            importing.pop()
+            import_times[package] = import_times.get(package, 0) + time.perf_counter() - started
+
+    builtins.__import__ = timed_import
+
+
+# This module is the first ndopapp imports, so profiling from here sees every other import
+if os.environ.get('COLD_START_PROFILE'):
+    profile_imports()
+
+
+def print_report():
+    print(f"{'phase':<16} {'ms':>8} {'modules':>8}")
+    for line in report():
+        print(f"{line['phase']:<16} {line['ms']:>8.1f} {line['modules_imported']:>8}")
+    print(f"{'total':<16} {total_seconds() * 1000:>8.1f}")
+
+    print(f"\n{'package':<16} {'ms':>8}")
+    for package, seconds in sorted(import_times.items(), key=lambda item: -item[1]):
+        if seconds >= 0.001:
+            print(f"{package:<16} {seconds * 1000:>8.1f}")
@@ -0,0 +1,78 @@
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import g, current_app as app, _app_ctx_stack, _request_ctx_stack
+
+from ndopapp import deadline
+from ndopapp.models import NDOP_RequestError
+
+
+pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ndop-fanout")
+
+
+def init_app(app):
+    global pool
+    pool.shutdown(wait=False)
+    pool = ThreadPoolExecutor(max_workers=app.config.get("FANOUT_MAX_WORKERS", 8), thread_name_prefix="ndop-fanout")
+
+
+def in_current_context(func):
+    """Wraps func so it runs inside the current app and request contexts from another thread
+
+    The context objects themselves are shared rather than copied, so the worker sees the
+    same request, session and g as the controller that submitted it.
+    """
+    app_ctx = _app_ctx_stack.top
+    request_ctx = _request_ctx_stack.top
+
+    @functools.wraps(func)
+    def in_current_context_wrapper(*args, **kwargs):
+        if app_ctx is not None:
+            _app_ctx_stack.push(app_ctx)
+        if request_ctx is not None:
+            _request_ctx_stack.push(request_ctx)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if request_ctx is not None:
+                _request_ctx_stack.pop()
+            if app_ctx is not None:
+                _app_ctx_stack.pop()
+
+    return in_current_context_wrapper
+
+
+class RequestExecutor:
+    """Issues independent backend calls for a single request at the same time
+
+    Every call submitted shares the same deadline, so a page waits for its slowest
+    call rather than the sum of all of them, and never longer than the deadline.
+    """
+
+    def __init__(self, timeout):
+        self.deadline = time.monotonic() + timeout
+
+    def submit(self, func, *args, **kwargs):
+        return pool.submit(in_current_context(func), *args, **kwargs)
+
+    def join(self, *futures):
+        _, not_done = wait(futures, timeout=max(0, self.deadline - time.monotonic()))
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            raise NDOP_RequestError(f'{len(not_done)} concurrent backend calls exceeded the request deadline')
+        return futures
+
+    def gather(self, *futures):
+        return [future.result() for future in self.join(*futures)]
+
+
+def request_executor():
+    if 'request_executor' not in g:
+        timeout = app.config.get("FANOUT_TIMEOUT", 25)
+        left = deadline.remaining()
+        if left is not None:
+            timeout = max(0, min(timeout, left))
+        g.request_executor = RequestExecutor(timeout)
+    return g.request_executor
@@ -26,6 +26,15 @@ URL_PREFIX = os.environ.get("URL_PREFIX", "")
 SERVER_NAME = os.environ.get('SERVER_NAME')
 
 IS_LOCAL_ENV = os.environ.get('LOCAL_DEVELOPMENT', 'False').lower() in ('true', '1')
+OPTIMISTIC_SESSION_CHECK = os.environ.get('OPTIMISTIC_SESSION_CHECK', 'False').lower() in ('true', '1')
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'False').lower() in ('true', '1')
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False').lower() in ('true', '1')
+TRACING = os.environ.get('TRACING', 'False').lower() in ('true', '1')
+LOG_SUMMARY = os.environ.get('LOG_SUMMARY', 'False').lower() in ('true', '1')
+LOG_DETAIL_SAMPLE_RATE = float(os.environ.get('LOG_DETAIL_SAMPLE_RATE', 0.01))
+EMF_METRICS = os.environ.get('EMF_METRICS', 'False').lower() in ('true', '1')
+# Only set where the backend is known to have the reset-state-model function
+STATE_MODEL_RESET = os.environ.get('STATE_MODEL_RESET', 'False').lower() in ('true', '1')
 
 if len(URL_PREFIX) > 0:
     URL_PREFIX = ensure_leading_slash(URL_PREFIX)
@@ -36,8 +45,68 @@ class Config(object):
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Strict'
     SECRET_KEY = b64decode(ENCODED_SECRET_KEY)
+    # How long a journey waits for PDS results, across many requests
     PDS_REQUEST_TIMEOUT = 30
+    # Every backend call a request makes shares this, which stays under API Gateway's 29s
+    REQUEST_DEADLINE = 25
+    # Longest any one call may take. The deadline wins, so a call late in a request
+    # only gets what is left of it, and none of these is longer than the deadline
+    API_TIMEOUT = 10
+    API_TIMEOUTS = {
+        "createsession": 5,
+        "checksession": 5,
+        "details": 20,
+        "patientsearchresult": 20,
+        "get-state-model": 5,
+        "put-state-model": 5,
+        "reset-state-model": 5,
+    }
+    API_POOL_CONNECTIONS = 1
+    API_POOL_MAXSIZE = 10
+    SESSION_CACHE_MAXSIZE = 1024
+    SESSION_CACHE_TTL = 10
+    SESSION_CACHE_INVALID_TTL = 60
+    OPTIMISTIC_SESSION_CHECK = OPTIMISTIC_SESSION_CHECK
+    CONCURRENT_SESSION_CHECK = True
+    FANOUT_MAX_WORKERS = 8
+    FANOUT_TIMEOUT = 25
     META_REFRESH_INTERVAL = 5
+    ADAPTIVE_REFRESH = True
+    REFRESH_MIN_INTERVAL = 1
+    REFRESH_MAX_INTERVAL = 10
+    REFRESH_BACKOFF = 1.5
+    LONG_POLL_TIMEOUT = 10
+    # The wait between polls doubles each time, so a request polls at most 6 times
+    LONG_POLL_INTERVAL = 0.5
+    LONG_POLL_MAX_INTERVAL = 3
+    RETRY_MAX_ATTEMPTS = 3
+    RETRY_BASE_DELAY = 0.1
+    RETRY_MAX_DELAY = 1
+    RETRY_BUDGET_RATIO = 0.1
+    RETRY_BUDGET_CAPACITY = 10
+    HEDGE_ENABLED = HEDGE_ENABLED
+    HEDGE_PERCENTILE = 95
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_MIN_DELAY = 0.05
+    HEDGE_MAX_RATE = 0.05
+    HEDGE_BUDGET_CAPACITY = 5
+    HEDGE_MAX_WORKERS = 8
+    METRICS_LOG_INTERVAL = 60
+    METRICS_ENDPOINT = IS_LOCAL_ENV
+    SERVER_TIMING = SERVER_TIMING
+    TRACING = TRACING
+    LOG_SUMMARY = LOG_SUMMARY
+    LOG_DETAIL_SAMPLE_RATE = LOG_DETAIL_SAMPLE_RATE
+    EMF_METRICS = EMF_METRICS
+    EMF_NAMESPACE = "NDOP/nojs"
+    BREAKER_WINDOW = 20
+    BREAKER_MINIMUM_CALLS = 10
+    BREAKER_ERROR_RATE = 0.5
+    BREAKER_SLOW_CALL_SECONDS = 5
+    BREAKER_SLOW_CALL_RATE = 0.8
+    BREAKER_OPEN_SECONDS = 30
+    EXCEPTION_LOG_WINDOW = 60
+    COLD_START_BUDGET = 1.5
     SERVICE_NAME = "Choose if data from your health records is shared for research and planning"
     CLIENT_FACING_URL = CLIENT_FACING_URL
     URL_PREFIX = URL_PREFIX
@@ -55,11 +124,20 @@ class Config(object):
     CONFIRMATION_SENDER_URL = API_URL + "confirmationsender"
     GET_STATE_MODEL_FUNCTION_NAME = API_URL + "get-state-model"
     PUT_STATE_MODEL_FUNCTION_NAME = API_URL + "put-state-model"
+    RESET_STATE_MODEL_FUNCTION_NAME = API_URL + "reset-state-model"
 
     AWS_ACCOUNT_ID = os.environ.get('AWS_ACCOUNT_ID')
     AWS_DEFAULT_REGION = os.environ.get('AWS_DEFAULT_REGION', "eu-west-2")
     AWS_ENV_NAME = os.environ.get('AWS_ENV_NAME')
 
+    STATE_MODEL_TRANSPORT = os.environ.get('STATE_MODEL_TRANSPORT', 'lambda')
+    STATE_MODEL_RESET = STATE_MODEL_RESET
+    LAMBDA_MAX_POOL_CONNECTIONS = 10
+    # Only used as they are by invocations with time left for all of them, see statemodel.LambdaTransport
+    LAMBDA_CONNECT_TIMEOUT = 2
+    LAMBDA_READ_TIMEOUT = 5
+    LAMBDA_MAX_ATTEMPTS = 2
+
     WTF_CSRF_SSL_STRICT = False
 
     THANKYOU_PAGE_FEEDBACK_SURVEY_ENDPOINT = "https://nhsdigital.eu.qualtrics.com/jfe/form/SV_eqvKn0D54sdz8c5"
@@ -68,5 +146,7 @@ class Config(object):
 class TestConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
+    CONCURRENT_SESSION_CHECK = False
+    LONG_POLL_TIMEOUT = 0
 
 
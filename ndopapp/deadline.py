@@ -0,0 +1,52 @@
+import time
+
+import requests
+from flask import g, has_app_context, current_app as app
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised instead of making a backend call once the request has no time left
+
+    It is a Timeout so callers handle it exactly like a backend call timing out.
+    """
+
+
+def init_app(app):
+    app.before_request(start)
+
+
+def start():
+    g.deadline = time.monotonic() + app.config.get("REQUEST_DEADLINE", 25)
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None when there is no deadline"""
+    if not has_app_context() or 'deadline' not in g:
+        return None
+    return g.deadline - time.monotonic()
+
+
+def timeout_for(endpoint, timeout=None):
+    """Timeout for one call to a backend endpoint
+
+    The timeout comes from the API_TIMEOUTS table unless the caller asks for one, and is
+    cut short so the call never runs past the request's deadline. Every backend call
+    draws down the same deadline, so a page making several calls cannot take several
+    times the timeout of any one of them.
+
+    Raises:
+        DeadlineExceeded: The deadline has already passed
+    """
+    if not has_app_context():
+        return timeout
+
+    if timeout is None:
+        timeout = app.config.get("API_TIMEOUTS", {}).get(endpoint, app.config.get("API_TIMEOUT"))
+
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        app.logger.warning("request deadline exceeded", {'endpoint': endpoint, 'overrun': round(-left, 3)})
+        raise DeadlineExceeded(f"request deadline exceeded before calling {endpoint}")
+    return left if timeout is None else min(timeout, left)
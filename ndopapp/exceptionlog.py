@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+import zlib
+
+
+logger = logging.getLogger("flask.app")
+
+# Past this many kinds of exception in a window, new kinds are logged in full every time
+MAX_FINGERPRINTS = 1000
+
+
+def fingerprint(exception):
+    """Identifies an exception by its type and the code locations in its traceback
+
+    Only walks the traceback's frames, without reading source lines as
+    traceback.extract_tb does, so it is cheap enough for every exception.
+    """
+    frames = []
+    tb = exception.__traceback__
+    while tb is not None:
+        frames.append(f"{tb.tb_frame.f_code.co_filename}:{tb.tb_lineno}")
+        tb = tb.tb_next
+    key = "|".join([type(exception).__name__] + frames)
+    return f"{zlib.crc32(key.encode()):08x}"
+
+
+class ExceptionLog:
+    """Decides which exceptions are logged in full, counting the repeats of those that aren't
+
+    The first exception of each fingerprint in a window of EXCEPTION_LOG_WINDOW
+    seconds is logged in full. Later ones in the same window are only counted,
+    and the count logged as an "exception repeated" line once the window ends.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.window = 60
+        self.windows = {}
+        self.next_sweep = None
+
+    def init_app(self, app):
+        self.window = app.config.get("EXCEPTION_LOG_WINDOW", 60)
+        with self.lock:
+            self.windows = {}
+            self.next_sweep = None
+        app.after_request(self.sweep_after_request)
+
+    def occurred(self, exception):
+        """Returns the exception's fingerprint if it should be logged in full, otherwise None"""
+        exception_fingerprint = fingerprint(exception)
+        self.sweep()
+
+        with self.lock:
+            window = self.windows.get(exception_fingerprint)
+            if window is not None:
+                window['repeats'] += 1
+                return None
+            if len(self.windows) < MAX_FINGERPRINTS:
+                ends = time.monotonic() + self.window
+                self.windows[exception_fingerprint] = {
+                    'exception_type': type(exception).__name__,
+                    'ends': ends,
+                    'repeats': 0,
+                }
+                if self.next_sweep is None or ends < self.next_sweep:
+                    self.next_sweep = ends
+
+        return exception_fingerprint
+
+    def sweep(self):
+        """Ends the windows that are over, logging how often their exception was repeated"""
+        now = time.monotonic()
+        if self.next_sweep is None or now < self.next_sweep:
+            return
+
+        with self.lock:
+            ended = {key: window for key, window in self.windows.items() if window['ends'] <= now}
+            for key in ended:
+                del self.windows[key]
+            self.next_sweep = min((window['ends'] for window in self.windows.values()), default=None)
+
+        for key, window in ended.items():
+            if window['repeats']:
+                logger.error("exception repeated", {
+                    'exception_fingerprint': key,
+                    'exception_type': window['exception_type'],
+                    'repeats': window['repeats'],
+                    'window': self.window,
+                })
+
+    def sweep_after_request(self, response):
+        self.sweep()
+        return response
+
+
+exception_log = ExceptionLog()
@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from ndopapp.concurrency import in_current_context
+from ndopapp.retry import RetryBudget
+from ndopapp.stats import RollingWindow
+
+
+logger = logging.getLogger("flask.app")
+
+
+class Hedger:
+    """Sends a second attempt of a slow idempotent call, and takes whichever answers first
+
+    The hedge is only sent once the first attempt has taken longer than the given
+    percentile of the endpoint's recent latencies, so it targets the tail rather
+    than doubling traffic. Hedges draw on a budget of max_rate of calls, in the same
+    way as retries. Attempts run on a pool of their own so that calls already running
+    on the request fan out pool can hedge without waiting on that pool.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.percentile = 95
+        self.min_samples = 20
+        self.min_delay = 0.05
+        self.budget = RetryBudget(ratio=0.05, capacity=5)
+        self.latencies = {}
+        self.pool = None
+        self.reset_counters()
+
+    def init_app(self, app):
+        self.enabled = app.config.get("HEDGE_ENABLED", False)
+        self.percentile = app.config.get("HEDGE_PERCENTILE", self.percentile)
+        self.min_samples = app.config.get("HEDGE_MIN_SAMPLES", self.min_samples)
+        self.min_delay = app.config.get("HEDGE_MIN_DELAY", self.min_delay)
+        self.budget = RetryBudget(app.config.get("HEDGE_MAX_RATE", 0.05), app.config.get("HEDGE_BUDGET_CAPACITY", 5))
+        self.latencies = {}
+        self.reset_counters()
+
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+        self.pool = None
+        if self.enabled:
+            self.pool = ThreadPoolExecutor(max_workers=app.config.get("HEDGE_MAX_WORKERS", 8),
+                                           thread_name_prefix="ndop-hedge")
+
+    def reset_counters(self):
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def latency(self, endpoint):
+        window = self.latencies.get(endpoint)
+        if window is None:
+            with self.lock:
+                window = self.latencies.setdefault(endpoint, RollingWindow())
+        return window
+
+    def timed(self, endpoint, call):
+        def timed_call():
+            started = time.monotonic()
+            result = call()
+            self.latency(endpoint).add(time.monotonic() - started)
+            return result
+        return timed_call
+
+    def hedge_delay(self, endpoint):
+        """Seconds to wait for the first attempt before hedging, or None if there is too little history"""
+        window = self.latency(endpoint)
+        if len(window) < self.min_samples:
+            return None
+        return max(self.min_delay, window.percentile(self.percentile))
+
+    def call(self, endpoint, call):
+        """Makes call, hedging it if the first attempt is slow and the budget allows"""
+        if not self.enabled:
+            return call()
+
+        with self.lock:
+            self.calls += 1
+        self.budget.deposit()
+
+        timed_call = self.timed(endpoint, call)
+        delay = self.hedge_delay(endpoint)
+        if delay is None:
+            return timed_call()
+
+        call = in_current_context(timed_call)
+        first = self.pool.submit(call)
+        done, _ = wait([first], timeout=delay)
+        if done or not self.budget.withdraw():
+            return first.result()
+
+        hedge = self.pool.submit(call)
+        with self.lock:
+            self.hedged += 1
+
+        for future in as_completed([first, hedge]):
+            if future.exception() is None:
+                break
+        else:
+            return first.result()
+
+        if future is hedge:
+            with self.lock:
+                self.hedge_wins += 1
+        logger.info("hedged backend call", {
+            'endpoint': endpoint,
+            'delay': round(delay, 3),
+            'winner': 'hedge' if future is hedge else 'first',
+        })
+        return future.result()
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'hedges_refused': self.budget.refused,
+        }
+
+
+hedger = Hedger()
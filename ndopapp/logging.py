@@ -1,11 +1,58 @@
+from collections import OrderedDict
+from collections.abc import Mapping
 from flask import request, has_request_context, g
+from json.encoder import encode_basestring_ascii
+from logging.handlers import QueueHandler, QueueListener
 
+import atexit
 import itertools
 import logging
 import json
-import collections
 import datetime
 import os
+import queue
+import sys
+import time
+
+from ndopapp import servertiming
+
+
+# Records held for the listener before new ones are dropped, 0 logs synchronously
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# Longest a request waits at its end for queued records to be written
+LOG_FLUSH_TIMEOUT = 1
+
+# Fields of every log line, in order, each a record attribute or an (attribute, name) pair
+LOG_FIELDS = (
+    ('levelname', 'log_level'),
+    ('asctime', 'time'),
+    'message',
+    'environment',
+    'api_request_id',
+    'api_stage',
+    'function_name',
+    'function_version',
+    'invocation_id',
+    'session_id',
+    'source_ip_address',
+    'user_agent',
+)
+
+queue_handler = None
+listener = None
+
+
+# Encoders giving the same text as json.dumps for the types most log fields have
+FAST_ENCODERS = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    bool: lambda value: "true" if value else "false",
+    type(None): lambda value: "null",
+}
+
+
+def encode(value):
+    return FAST_ENCODERS.get(type(value), json.dumps)(value)
 
 
 class PipeFormatter(logging.Formatter):
@@ -16,25 +63,54 @@ class PipeFormatter(logging.Formatter):
         self.fields = fields
         self.datefmt = datefmt
 
-    def ipairs(self, record):
-        for field in self.fields:
-            alias = field
-            if not isinstance(field, str):
-                field, alias = field
-            yield alias, getattr(record, field, "")
-
-        if isinstance(record.args, collections.Mapping):
-            yield from record.args.items()
+        # Worked out once rather than for every record
+        self.plan = tuple(
+            (field, f"{field}=") if isinstance(field, str) else (field[0], f"{field[1]}=")
+            for field in fields
+        )
+        self.uses_time = 'asctime' in itertools.chain.from_iterable((field, field[0]) for field in fields)
 
     def formatMessage(self, record):
-        return " | ".join(f"{k}={json.dumps(v)}" for k, v in self.ipairs(record))
+        parts = [prefix + encode(getattr(record, field, "")) for field, prefix in self.plan]
+        if isinstance(record.args, Mapping):
+            parts.extend(f"{k}=" + encode(v) for k, v in record.args.items())
+        return " | ".join(parts)
 
     def formatTime(self, record, date_format=None):
         created = self.converter(record.created)
         return created.strftime(date_format or "%d-%m-%Y %H:%M:%S.%f %z").strip()
 
     def usesTime(self):
-        return 'asctime' in itertools.chain.from_iterable((field, field[0]) for field in self.fields)
+        return self.uses_time
+
+
+def request_log_context():
+    """Log record attributes taken from the current request, the same for every line it logs"""
+    fields = {}
+
+    # Request attributes
+    x_forwarded_for = request.headers.get('X-Forwarded-For', '')
+    try:
+        # Assume we've got 2 proxies
+        fields['source_ip_address'] = x_forwarded_for.split(',')[-3].strip()
+    except IndexError:
+        fields['source_ip_address'] = request.remote_addr
+
+    # Cookies
+    fields['session_id'] = request.cookies.get('session_id_nojs')
+
+    # Headers
+    fields['api_request_id'] = request.headers.get('X-AMZ-REQUEST-ID')
+    fields['api_stage'] = request.headers.get('X-AMZ-STAGE')
+    fields['user_agent'] = request.headers.get('User-Agent')
+
+    # Lambda context
+    context = request.environ.get('lambda.context')
+    fields['function_name'] = context and context.function_name or None
+    fields['function_version'] = context and context.function_version or None
+    fields['invocation_id'] = context and context.aws_request_id or None
+
+    return fields
 
 
 def record_factory(*args, **kwargs):
@@ -42,48 +118,23 @@ def record_factory(*args, **kwargs):
     record.environment = os.environ.get('AWS_ENV_NAME')
 
     if has_request_context():
-        # Request attributes
-        x_forwarded_for = request.headers.get('X-Forwarded-For', '')
-        try:
-            # Assume we've got 2 proxies
-            record.source_ip_address = x_forwarded_for.split(',')[-3].strip()
-        except IndexError:
-            record.source_ip_address = request.remote_addr
+        # Worked out once per request, on its first log line
+        fields = g.get('log_context')
+        if fields is None:
+            fields = g.setdefault('log_context', request_log_context())
+        record.__dict__.update(fields)
 
-        # Cookies
-        record.session_id = g.get('session_id_override', request.cookies.get('session_id_nojs'))
-
-        # Headers
-        record.api_request_id = request.headers.get('X-AMZ-REQUEST-ID')
-        record.api_stage = request.headers.get('X-AMZ-STAGE')
-        record.user_agent = request.headers.get('User-Agent')
-
-        # Lambda context
-        context = request.environ.get('lambda.context')
-        record.function_name = context and context.function_name or None
-        record.function_version = context and context.function_version or None
-        record.invocation_id = context and context.aws_request_id or None
+        # Controllers may switch to a new session part way through a request
+        if 'session_id_override' in g:
+            record.session_id = g.get('session_id_override')
 
     return record
 
 
-def install_logger():
+def install_logger(queue_size=LOG_QUEUE_SIZE):
     logging.setLogRecordFactory(record_factory)
 
-    formatter = PipeFormatter([
-        ('levelname', 'log_level'),
-        ('asctime', 'time'),
-        'message',
-        'environment',
-        'api_request_id',
-        'api_stage',
-        'function_name',
-        'function_version',
-        'invocation_id',
-        'session_id',
-        'source_ip_address',
-        'user_agent'
-    ])
+    formatter = PipeFormatter(LOG_FIELDS)
 
     handler = logging.StreamHandler()
     handler.setFormatter(formatter)
@@ -91,5 +142,151 @@ def install_logger():
     logger = logging.getLogger("flask.app")
     logger.handlers = []
     logger.propagate = False
-    logger.addHandler(handler)
+    logger.addHandler(queued(handler, queue_size) if queue_size else handler)
     logger.setLevel(os.environ.get('LOG_LEVEL', logging.INFO))
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Puts records on a bounded queue for a QueueListener, counting rather than waiting on those that don't fit"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # emit, and so enqueue, is always called holding the handler's lock
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Records are formatted by the listener's handler, which needs their args intact
+        return record
+
+    def take_dropped(self):
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+def queued(handler, queue_size):
+    """Moves writing records with handler off the logging thread, onto a listener thread of its own"""
+    global queue_handler, listener
+    stop_listener()
+
+    log_queue = queue.Queue(queue_size)
+    queue_handler = BoundedQueueHandler(log_queue)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return queue_handler
+
+
+def stop_listener():
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+atexit.register(stop_listener)
+
+
+def flush_logs(exception=None):
+    """Waits for queued records to be written
+
+    Called as each request is torn down, since a Lambda is frozen between
+    invocations and its listener thread with it.
+    """
+    if listener is None:
+        return
+
+    dropped = queue_handler.take_dropped()
+    if dropped:
+        logging.getLogger("flask.app").warning("log records dropped", {'dropped': dropped})
+
+    log_queue = queue_handler.queue
+    give_up = time.monotonic() + LOG_FLUSH_TIMEOUT
+    with log_queue.all_tasks_done:
+        while log_queue.unfinished_tasks:
+            left = give_up - time.monotonic()
+            if left <= 0:
+                break
+            log_queue.all_tasks_done.wait(left)
+
+
+class EmfEmitter:
+    """Writes each request's metrics to stdout as one CloudWatch Embedded Metric Format line
+
+    Enabled by EMF_METRICS. Every name timed for the Server-Timing header becomes a
+    metric in milliseconds, so backend calls by endpoint ("api-checksession",
+    "lambda-get-state-model"), the session check, rendering and the session cookie,
+    as does the request as a whole. The session cookie's size and anything added
+    with put are included too. Metrics are dimensioned by controller, which for the
+    waiting pages is the journey step.
+
+    https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.namespace = "NDOP/nojs"
+
+    def init_app(self, app):
+        self.enabled = app.config.get("EMF_METRICS", False)
+        self.namespace = app.config.get("EMF_NAMESPACE", self.namespace)
+        if not self.enabled:
+            return
+
+        servertiming.collect(app)
+        app.after_request(self.note_status)
+        app.teardown_request(self.flush)
+
+    def put(self, name, value, unit="Count"):
+        """Adds a value of a metric to the current request's line"""
+        if self.enabled and has_request_context():
+            g.setdefault('emf_metrics', OrderedDict()).setdefault(name, (unit, []))[1].append(value)
+
+    @staticmethod
+    def note_status(response):
+        g.emf_status = response.status_code
+        return response
+
+    def metrics(self):
+        metrics = OrderedDict()
+        for name, started, seconds in g.server_timing:
+            if started is not None:
+                seconds = time.monotonic() - started
+            # Each call is a value of its own, so percentiles are of calls rather than requests
+            name = "request" if name == "total" else name
+            metrics.setdefault(name, ("Milliseconds", []))[1].append(round(seconds * 1000, 1))
+        if 'session_cookie_bytes' in g:
+            metrics["session-cookie-size"] = ("Bytes", [g.session_cookie_bytes])
+        metrics.update(g.get('emf_metrics', {}))
+        return metrics
+
+    def flush(self, exception=None):
+        if 'server_timing' not in g:
+            return
+
+        metrics = self.metrics()
+        line = OrderedDict(_aws={
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': self.namespace,
+                'Dimensions': [['Controller']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (unit, _) in metrics.items()],
+            }],
+        })
+        line['Controller'] = request.url_rule.endpoint if request.url_rule else "unmatched"
+        line['Status'] = g.get('emf_status')
+        for name, (_, values) in metrics.items():
+            line[name] = values[0] if len(values) == 1 else values
+
+        # Straight to stdout rather than through the log handler, EMF lines must be JSON alone
+        sys.stdout.write(json.dumps(line) + "\n")
+        sys.stdout.flush()
+
+
+emf = EmfEmitter()
+
@@ -0,0 +1,79 @@
+import logging
+import zlib
+
+from flask import g, request, has_request_context
+
+from ndopapp import servertiming
+from ndopapp.metrics import outcome_of
+
+
+logger = logging.getLogger("flask.app")
+
+
+def sampled(session_id, rate):
+    """Whether a session's requests are logged in full, the same answer for every request it makes"""
+    if not session_id:
+        return False
+    return zlib.crc32(session_id.encode()) % 10000 < rate * 10000
+
+
+class SummaryFilter(logging.Filter):
+    """Drops a request's info lines unless its session is sampled, counting what it drops"""
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not has_request_context():
+            return True
+        if getattr(record, 'request_summary', False):
+            return True
+        if sampled(getattr(record, 'session_id', None), self.sample_rate):
+            return True
+
+        g.log_suppressed = g.get('log_suppressed', 0) + 1
+        return False
+
+
+def init_app(app):
+    """Logs one summary line per request, in place of its info lines, when LOG_SUMMARY is set
+
+    Requests from a LOG_DETAIL_SAMPLE_RATE share of sessions are still logged in
+    full, and warnings and errors always are.
+    """
+    for summary_filter in [f for f in logger.filters if isinstance(f, SummaryFilter)]:
+        logger.removeFilter(summary_filter)
+
+    if not app.config.get("LOG_SUMMARY"):
+        return
+
+    logger.addFilter(SummaryFilter(app.config.get("LOG_DETAIL_SAMPLE_RATE", 0.01)))
+    # Backend calls are timed as they are for the Server-Timing header
+    servertiming.collect(app)
+    app.after_request(finish)
+    app.teardown_request(summarise)
+
+
+def finish(response):
+    g.log_summary_status = response.status_code
+    return response
+
+
+def summarise(exception=None):
+    if 'server_timing' not in g:
+        return
+
+    timings = servertiming.durations(g.server_timing)
+    total, _ = timings.pop("total")
+    status = g.get('log_summary_status')
+
+    logger.info("request summary", {
+        'controller': request.url_rule.endpoint if request.url_rule else "unmatched",
+        'method': request.method,
+        'status': status,
+        'outcome': "error" if status is None else outcome_of(status),
+        'duration_ms': round(total * 1000, 1),
+        'calls': {name: {'count': count, 'ms': round(seconds * 1000, 1)} for name, (seconds, count) in timings.items()},
+        'suppressed': g.get('log_suppressed', 0),
+    }, extra={'request_summary': True})
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, make_response, session, c
 from ndopapp.utils import TemplateView
 from .forms import LandingPageForm
 from ndopapp import routes
+from ndopapp.cache import session_cache
 from ndopapp.routes import redirect_to_route
 from ndopapp.csrf import csrf
 
@@ -23,6 +24,7 @@ def landing_page():
         return make_response(redirect_to_route('yourdetails.your_details'))
 
     session.clear()
+    session_cache.invalidate(request.cookies.get('session_id_nojs'))
     app.logger.info("session cleared")
 
     form = LandingPageForm()
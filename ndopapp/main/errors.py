@@ -1,4 +1,6 @@
-from flask import Blueprint
+from flask import Blueprint, current_app as app
+from ndopapp.models import NDOP_ServiceUnavailableError
+from ndopapp.pagecache import page_cache
 from ndopapp.utils import log_safe_exception
 from ndopapp.routes import redirect_to_route
 
@@ -14,3 +16,12 @@ def page_not_found(e):
 def handle_unexpected_error(exception):
     log_safe_exception(exception)
     return redirect_to_route('main.generic_error')
+
+
+@errors_blueprint.app_errorhandler(NDOP_ServiceUnavailableError)
+def service_busy(exception):
+    app.logger.info("serving service busy page", {'reason': exception.safe_message})
+    response = page_cache.render('main/service-busy.html')
+    response.status_code = exception.status_code
+    response.headers['Retry-After'] = str(app.config.get("BREAKER_OPEN_SECONDS", 30))
+    return response
@@ -0,0 +1,144 @@
+import bisect
+import logging
+import threading
+import time
+
+import requests
+from flask import g, request, jsonify
+
+
+logger = logging.getLogger("flask.app")
+
+# Upper bounds of the histogram buckets in milliseconds, on a 1-2-5 log scale
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 30000, float("inf"))
+
+
+def outcome_of(status_code=None, exception=None):
+    """Outcome label for a call, from its response status or the exception it raised"""
+    if exception is not None:
+        return "timeout" if isinstance(exception, requests.exceptions.Timeout) else "error"
+    if status_code >= 500:
+        return "5xx"
+    if status_code >= 400:
+        return "4xx"
+    return "ok"
+
+
+class Histogram:
+    """Counts of durations in fixed log scale buckets"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0
+        self.max_ms = 0
+
+    def observe(self, milliseconds):
+        self.counts[bisect.bisect_left(BUCKETS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the given percentile, capped at the largest duration seen"""
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 1) if self.count else 0,
+            'p50_ms': round(self.percentile(50), 1),
+            'p95_ms': round(self.percentile(95), 1),
+            'p99_ms': round(self.percentile(99), 1),
+            'max_ms': round(self.max_ms, 1),
+        }
+
+
+class Metrics:
+    """In process latency histograms keyed by kind, endpoint and outcome
+
+    Kinds are 'controller' for the app's own pages, 'api' for NDOP API calls and
+    'lambda' for lambda invocations. Summaries are logged every METRICS_LOG_INTERVAL
+    seconds, from whichever request finishes after the interval has passed, and can
+    be read from /__metrics when METRICS_ENDPOINT is set. The counters of any stats
+    sources added with add_stats are reported alongside them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.stats_sources = {}
+        self.log_interval = 60
+        self.last_logged = time.monotonic()
+
+    def init_app(self, app):
+        self.clear()
+        self.log_interval = app.config.get("METRICS_LOG_INTERVAL", 60)
+
+        app.before_request(self.start_controller)
+        app.after_request(self.observe_controller)
+
+        if app.config.get("METRICS_ENDPOINT"):
+            app.add_url_rule("/__metrics", "metrics", self.endpoint)
+
+    def clear(self):
+        with self.lock:
+            self.histograms = {}
+            self.last_logged = time.monotonic()
+
+    def add_stats(self, name, source):
+        """Reports source.stats() under name with the latency summaries"""
+        self.stats_sources[name] = source
+
+    def stats(self):
+        return {name: source.stats() for name, source in sorted(self.stats_sources.items())}
+
+    def observe(self, kind, endpoint, outcome, seconds):
+        key = (kind, endpoint, outcome)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds * 1000)
+
+    def summaries(self):
+        with self.lock:
+            return [
+                dict(kind=kind, endpoint=endpoint, outcome=outcome, **histogram.summary())
+                for (kind, endpoint, outcome), histogram in sorted(self.histograms.items())
+            ]
+
+    def log_summaries(self):
+        for summary in self.summaries():
+            logger.info("latency summary", summary)
+        if self.stats_sources:
+            logger.info("backend stats", self.stats())
+
+    def start_controller(self):
+        g.controller_started = time.monotonic()
+
+    def observe_controller(self, response):
+        started = g.get("controller_started")
+        if started is not None:
+            endpoint = request.url_rule.endpoint if request.url_rule else "unmatched"
+            self.observe("controller", endpoint, outcome_of(response.status_code), time.monotonic() - started)
+
+        with self.lock:
+            due = time.monotonic() - self.last_logged >= self.log_interval
+            if due:
+                self.last_logged = time.monotonic()
+        if due:
+            self.log_summaries()
+        return response
+
+    def endpoint(self):
+        return jsonify({'latency': self.summaries(), 'stats': self.stats()})
+
+
+latency_metrics = Metrics()
@@ -18,3 +18,13 @@ class NDOP_API_Error(NDOP_Error):
     pass
 
 
+class NDOP_SessionExpiredError(NDOP_Error):
+    pass
+
+
+class NDOP_FunctionNotFoundError(NDOP_Error):
+    pass
+
+
+class NDOP_ServiceUnavailableError(NDOP_Error):
+    status_code = 503
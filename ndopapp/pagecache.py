@@ -0,0 +1,57 @@
+import threading
+
+from flask import Response, current_app as app, make_response, render_template, request, session
+
+
+class PageCache:
+    """Pages that depend only on config and their context, rendered once per process
+
+    The rendered bytes and their headers are kept per template and context, so serving
+    one of these pages again skips Jinja entirely. Only pass contexts with a small,
+    bounded set of values, as every distinct context is kept for the life of the process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = {}
+
+    def init_app(self, app):
+        with self.lock:
+            self.pages.clear()
+
+    def render(self, template, **context):
+        """Returns a response for template, rendering it only the first time context is seen
+
+        Flashed messages are rendered into the page, so while any are waiting in the
+        session the page is rendered as normal and nothing is cached.
+        """
+        if session.get('_flashes'):
+            return make_response(render_template(template, **context))
+
+        key = (template, tuple(sorted(context.items(), key=lambda item: item[0])))
+        page = self.pages.get(key)
+        if page is not None:
+            # Logged in place of the template_rendered signal, which a cached page doesn't send
+            app.logger.info('rendering page', {
+                'page': request.url_rule and request.url_rule.endpoint,
+                'template': template,
+                'cached': True,
+            })
+        else:
+            body = render_template(template, **context).encode('utf-8')
+            headers = (
+                ('Content-Type', 'text/html; charset=utf-8'),
+                ('Content-Length', str(len(body))),
+            )
+            page = (body, headers)
+            with self.lock:
+                self.pages[key] = page
+
+        body, headers = page
+        return Response(body, headers=list(headers))
+
+    def __len__(self):
+        return len(self.pages)
+
+
+page_cache = PageCache()
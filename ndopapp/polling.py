@@ -0,0 +1,108 @@
+import math
+import time
+
+from flask import current_app as app
+
+from ndopapp import deadline
+from ndopapp.logging import emf
+from ndopapp.stats import RollingWindow
+
+
+def long_poll(poll, session_id, is_complete, result=None, until=None):
+    """Polls the backend in process until is_complete(result), for up to LONG_POLL_TIMEOUT seconds
+
+    Waiting here between polls saves the browser a meta refresh, and with it a whole
+    lambda invocation and session check, for every poll answered in time. The wait
+    starts at LONG_POLL_INTERVAL and doubles after each poll, up to
+    LONG_POLL_MAX_INTERVAL, so a slow backend is not polled any harder.
+
+    Args:
+        poll (callable): Backend call taking the session id
+        session_id (str): The session id to poll for
+        is_complete (callable): Returns True once a result no longer needs polling
+        result: Result of a poll already made by the caller, if any
+        until (int): Epoch time the journey times out at, the wait never runs past it
+
+    Returns:
+        The last result returned by poll
+    """
+    give_up_at = time.monotonic() + app.config.get("LONG_POLL_TIMEOUT", 0)
+    if until:
+        give_up_at = min(give_up_at, time.monotonic() + int(until) - time.time())
+    left = deadline.remaining()
+    if left is not None:
+        # Leave the request time to make its last poll and answer
+        give_up_at = min(give_up_at, time.monotonic() + left / 2)
+    interval = app.config.get("LONG_POLL_INTERVAL", 1)
+    longest_interval = app.config.get("LONG_POLL_MAX_INTERVAL", interval)
+
+    if result is None:
+        result = poll(session_id)
+    polls = 1
+
+    while not is_complete(result) and time.monotonic() + interval < give_up_at:
+        time.sleep(interval)
+        result = poll(session_id)
+        polls += 1
+        interval = min(interval * 2, longest_interval)
+
+    emf.put("polls", polls)
+    if polls > 1:
+        app.logger.info("long poll finished", {'polls': polls, 'complete': is_complete(result)})
+    return result
+
+
+def timed_out(session):
+    """Whether the session's wait for results has passed its timeout_threshold"""
+    threshold = session.get('timeout_threshold')
+    return bool(threshold) and int(threshold) <= int(time.time())
+
+
+# How long journeys took to complete each kind of poll, across all sessions
+completion_times = {
+    'pds_search': RollingWindow(),
+    'store_preference': RollingWindow(),
+}
+
+
+def track(session, poll_type):
+    """Starts timing a poll for the session, unless it is already being timed"""
+    polls = dict(session.get('polls') or {})
+    if poll_type not in polls:
+        polls[poll_type] = (time.time(), 0)
+        session['polls'] = polls
+
+
+def next_refresh_interval(session, poll_type):
+    """Seconds the waiting page should wait before polling poll_type again
+
+    The first refresh is timed for when similar journeys usually complete, and the
+    interval backs off after every refresh that still finds the result incomplete.
+    """
+    polls = dict(session.get('polls') or {})
+    started, refreshes = polls.get(poll_type) or (time.time(), 0)
+    polls[poll_type] = (started, refreshes + 1)
+    session['polls'] = polls
+
+    if not app.config.get("ADAPTIVE_REFRESH"):
+        return app.config.get("META_REFRESH_INTERVAL")
+
+    shortest = app.config.get("REFRESH_MIN_INTERVAL", 1)
+    longest = app.config.get("REFRESH_MAX_INTERVAL", app.config.get("META_REFRESH_INTERVAL"))
+
+    interval = shortest * app.config.get("REFRESH_BACKOFF", 2) ** refreshes
+    usual_completion = completion_times[poll_type].percentile(50)
+    if usual_completion is not None:
+        interval = max(interval, usual_completion - (time.time() - started))
+
+    return int(math.ceil(min(max(interval, shortest), longest)))
+
+
+def finish(session, poll_type, completed=True):
+    """Stops timing a poll, recording how long it took if the backend completed it"""
+    polls = dict(session.get('polls') or {})
+    started, _ = polls.pop(poll_type, (None, None))
+    session['polls'] = polls
+
+    if completed and started is not None:
+        completion_times[poll_type].add(time.time() - started)
@@ -0,0 +1,99 @@
+import random
+import threading
+import time
+
+import requests
+from flask import current_app as app
+
+from ndopapp import deadline
+
+
+# Gateway statuses that say nothing reached, or was done by, the backend
+RETRY_STATUSES = (502, 503, 504)
+
+
+class RetryBudget:
+    """Process wide token bucket capping retries to a share of backend calls
+
+    Every call deposits ratio tokens and every retry withdraws a whole one, so
+    retries can never add more than that share of traffic on top of the calls
+    themselves, however badly the backend is failing.
+    """
+
+    def __init__(self, ratio=0.1, capacity=10):
+        self.lock = threading.Lock()
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+        self.retried = 0
+        self.refused = 0
+
+    def init_app(self, app):
+        with self.lock:
+            self.ratio = app.config.get("RETRY_BUDGET_RATIO", self.ratio)
+            self.capacity = app.config.get("RETRY_BUDGET_CAPACITY", self.capacity)
+            self.tokens = self.capacity
+            self.retried = 0
+            self.refused = 0
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                self.refused += 1
+                return False
+            self.tokens -= 1
+            self.retried += 1
+            return True
+
+    def stats(self):
+        return {'tokens': self.tokens, 'retried': self.retried, 'refused': self.refused}
+
+
+retry_budget = RetryBudget()
+
+
+def backoff(attempt):
+    """Full jitter backoff, so clients retrying at once spread out rather than retry in step"""
+    ceiling = min(app.config.get("RETRY_MAX_DELAY", 1), app.config.get("RETRY_BASE_DELAY", 0.1) * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def call_with_retries(call, endpoint):
+    """Makes an idempotent backend call, retrying connection and gateway errors
+
+    A retry is only made while attempts, the retry budget and the request deadline
+    all allow it. Otherwise the last response is returned, or the last connection
+    error raised, just as if the call had been made once.
+    """
+    retry_budget.deposit()
+    attempt = 0
+
+    while True:
+        failure = None
+        try:
+            response = call()
+            if response.status_code not in RETRY_STATUSES:
+                return response
+        except requests.exceptions.ConnectionError as e:
+            failure = e
+
+        attempt += 1
+        delay = backoff(attempt - 1)
+        left = deadline.remaining()
+        if attempt >= app.config.get("RETRY_MAX_ATTEMPTS", 3) \
+                or (left is not None and delay >= left) \
+                or not retry_budget.withdraw():
+            if failure is not None:
+                raise failure
+            return response
+
+        app.logger.info("retrying backend call", {
+            'endpoint': endpoint,
+            'attempt': attempt,
+            'reason': type(failure).__name__ if failure else response.status_code,
+        })
+        time.sleep(delay)
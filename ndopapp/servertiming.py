@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+
+from flask import g, has_app_context, before_render_template, template_rendered
+from flask.sessions import SecureCookieSessionInterface
+
+
+def init_app(app):
+    """Adds a Server-Timing header to every response when SERVER_TIMING is set"""
+    if app.config.get("SERVER_TIMING"):
+        collect(app).add_header = True
+
+
+def collect(app):
+    """Times each of app's requests into g.server_timing, for the header or anything else reporting on them"""
+    session_interface = app.extensions.get("servertiming")
+    if session_interface is None:
+        session_interface = app.extensions["servertiming"] = TimedSessionInterface()
+        app.session_interface = session_interface
+        app.before_request(start)
+        before_render_template.connect(start_render, app)
+        template_rendered.connect(finish_render, app)
+    return session_interface
+
+
+def start():
+    g.server_timing = [("total", time.monotonic(), None)]
+
+
+def record(name, seconds):
+    """Adds seconds spent in name to the current response's Server-Timing, if it has one"""
+    if has_app_context() and 'server_timing' in g:
+        g.server_timing.append((name, None, seconds))
+
+
+def start_render(sender, template, **extra):
+    g.render_started = time.monotonic()
+
+
+def finish_render(sender, template, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        record("render", time.monotonic() - started)
+
+
+def durations(timings):
+    """Seconds spent in and number of calls of each name, in the order first seen"""
+    totals = OrderedDict()
+    for name, started, seconds in timings:
+        if started is not None:
+            seconds = time.monotonic() - started
+        total, count = totals.get(name, (0, 0))
+        totals[name] = (total + seconds, count + 1)
+    return totals
+
+
+def header_value(timings):
+    """Server-Timing value with the durations of each name added up, in the order first seen"""
+    metrics = []
+    for name, (total, count) in durations(timings).items():
+        metric = f"{name};dur={total * 1000:.1f}"
+        if count > 1:
+            metric += f';desc="{count} calls"'
+        metrics.append(metric)
+    return ", ".join(metrics)
+
+
+class TimedSessionInterface(SecureCookieSessionInterface):
+    """Times and sizes the session cookie, the last thing done to a response, then adds the header"""
+
+    add_header = False
+
+    def save_session(self, app, session, response):
+        started = time.monotonic()
+        super().save_session(app, session, response)
+        record("session-cookie", time.monotonic() - started)
+
+        if 'server_timing' not in g:
+            return
+        for cookie in response.headers.getlist('Set-Cookie'):
+            if cookie.startswith(f"{app.session_cookie_name}="):
+                g.session_cookie_bytes = len(cookie)
+        if self.add_header:
+            response.headers['Server-Timing'] = header_value(g.server_timing)
@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Shares one in flight call between concurrent callers asking for the same key
+
+    The first caller for a key makes the call, and any caller arriving while it is
+    still in flight waits for and returns the same result (or raises the same
+    exception) instead of making a duplicate call. Nothing is kept once the call
+    completes, so a later caller always makes a fresh call.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.made = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+                self.made += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.forget(key)
+            call.set_exception(e)
+            raise
+
+        self.forget(key)
+        call.set_result(result)
+        return result
+
+    def forget(self, key):
+        with self.lock:
+            self.calls.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.calls.clear()
+            self.made = 0
+            self.shared = 0
+
+    def stats(self):
+        return {'in_flight': len(self.calls), 'made': self.made, 'shared': self.shared}
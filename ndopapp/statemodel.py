@@ -0,0 +1,255 @@
+import base64
+import json
+import threading
+import time
+from http import HTTPStatus
+
+import requests
+from flask import current_app as app
+
+from ndopapp import deadline, servertiming, tracing
+from ndopapp.client import api_client, JSON_HEADERS
+from ndopapp.deadline import DeadlineExceeded
+from ndopapp.metrics import latency_metrics, outcome_of
+from ndopapp.models import NDOP_FunctionNotFoundError
+
+
+# Imported on the first lambda invocation rather than on every cold start, see LambdaTransport.get_client
+boto3 = None
+
+# State model fields that survive a reset, see utils.clean_state_model_locally
+KEPT_FIELDS = ("contact_centre", "expiry_time_key", "flow")
+
+
+def function_arn(config, function_name):
+    return "arn:aws:lambda:{}:{}:function:{}-{}".format(
+        str(config.get("AWS_DEFAULT_REGION")),
+        str(config.get("AWS_ACCOUNT_ID")),
+        str(config.get("AWS_ENV_NAME")),
+        function_name,
+    )
+
+
+class LambdaTransport:
+    """Invokes the state model lambdas through one boto3 client kept for the life of the process
+
+    The client, its connection pool and the function ARNs are only built once, rather
+    than for every invocation. An invocation with less time left than the client could
+    take, with its timeouts and retries, is made by a client whose timeouts add up to
+    the whole seconds left and which does not retry. There is one of those for each
+    number of seconds, built the first time it is needed.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.client = None
+        self.budget_clients = {}
+        self.arns = {}
+
+        connect_timeout = config.get("LAMBDA_CONNECT_TIMEOUT", 2)
+        read_timeout = config.get("LAMBDA_READ_TIMEOUT", 5)
+        # botocore's max_attempts is the number of retries, on top of the first attempt
+        self.longest_invoke = (connect_timeout + read_timeout) * (config.get("LAMBDA_MAX_ATTEMPTS", 2) + 1)
+
+    def build_client(self, connect_timeout, read_timeout, max_attempts):
+        global boto3
+        if boto3 is None:
+            import boto3
+        from botocore.config import Config as BotoConfig
+
+        # boto3's default session is not thread safe, so the client gets a session of its own
+        return boto3.session.Session().client(
+            'lambda',
+            region_name=self.config.get("AWS_DEFAULT_REGION"),
+            config=BotoConfig(
+                max_pool_connections=self.config.get("LAMBDA_MAX_POOL_CONNECTIONS", 10),
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                retries={'max_attempts': max_attempts},
+            ),
+        )
+
+    def get_client(self, timeout=None):
+        """The client for an invocation that has to finish within timeout seconds, if given"""
+        if timeout is not None and timeout < self.longest_invoke:
+            return self.get_budget_client(int(timeout))
+
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = self.build_client(
+                        self.config.get("LAMBDA_CONNECT_TIMEOUT", 2),
+                        self.config.get("LAMBDA_READ_TIMEOUT", 5),
+                        self.config.get("LAMBDA_MAX_ATTEMPTS", 2),
+                    )
+        return self.client
+
+    def get_budget_client(self, seconds):
+        if seconds < 1:
+            raise DeadlineExceeded("less than a second left for a lambda invocation")
+
+        client = self.budget_clients.get(seconds)
+        if client is None:
+            with self.lock:
+                client = self.budget_clients.get(seconds)
+                if client is None:
+                    connect_timeout = min(self.config.get("LAMBDA_CONNECT_TIMEOUT", 2), seconds / 2)
+                    client = self.budget_clients[seconds] = self.build_client(
+                        connect_timeout, seconds - connect_timeout, 0)
+        return client
+
+    @staticmethod
+    def observe(function_name, outcome, started, span):
+        seconds = time.monotonic() - started
+        latency_metrics.observe("lambda", function_name, outcome, seconds)
+        servertiming.record(f"lambda-{function_name}", seconds)
+        tracing.finish_span(span, outcome)
+
+    def arn(self, function_name):
+        arn = self.arns.get(function_name)
+        if arn is None:
+            arn = self.arns[function_name] = function_arn(self.config, function_name)
+        return arn
+
+    @staticmethod
+    def errors():
+        """Exceptions an invocation can fail with, besides the function not being deployed"""
+        from botocore.exceptions import BotoCoreError, ClientError
+        return BotoCoreError, ClientError, DeadlineExceeded
+
+    def invoke(self, function_name, payload, timeout=None):
+        kwargs = {}
+        span = tracing.start_span("lambda", function_name)
+        if span is not None:
+            # The trace goes in the client context, as the put payload is stored as it is
+            kwargs['ClientContext'] = base64.b64encode(json.dumps({'custom': span.headers()}).encode()).decode()
+
+        started = time.monotonic()
+        try:
+            resp = self.get_client(timeout).invoke(
+                FunctionName=self.arn(function_name),
+                Payload=payload,
+                **kwargs
+            )
+        except Exception as e:
+            from botocore.exceptions import ClientError, ConnectTimeoutError, ReadTimeoutError
+            if isinstance(e, (ConnectTimeoutError, ReadTimeoutError)):
+                # Handled like a backend call timing out
+                e = DeadlineExceeded(f"{function_name} timed out")
+            self.observe(function_name, outcome_of(exception=e), started, span)
+            if isinstance(e, DeadlineExceeded):
+                app.logger.warning("lambda invocation timed out", {'function': function_name, 'timeout': timeout})
+                raise e
+            if isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') == 'ResourceNotFoundException':
+                raise NDOP_FunctionNotFoundError(f'{function_name} is not deployed')
+            raise
+
+        status_code = resp['StatusCode']
+        self.observe(function_name, outcome_of(status_code), started, span)
+        if status_code != HTTPStatus.OK.value:
+            app.logger.info(f'ERROR: aws_lambda_invoke: func={function_name}: status_code={status_code}')
+            return None
+        return json.loads(resp['Payload'].read())
+
+
+class HttpTransport:
+    """Calls the NDOP mock's /get-state-model and /put-state-model instead of the lambdas
+
+    Lets the state model path be run and benchmarked locally, without AWS.
+    """
+
+    def __init__(self, config):
+        self.urls = {
+            'get-state-model': ('GET', config.get("GET_STATE_MODEL_FUNCTION_NAME")),
+            'put-state-model': ('POST', config.get("PUT_STATE_MODEL_FUNCTION_NAME")),
+            'reset-state-model': ('POST', config.get("RESET_STATE_MODEL_FUNCTION_NAME")),
+        }
+
+    @staticmethod
+    def errors():
+        """Exceptions a call can fail with, besides the endpoint not being there"""
+        return requests.exceptions.RequestException,
+
+    def invoke(self, function_name, payload, timeout=None):
+        method, url = self.urls[function_name]
+        session_id = json.loads(payload).get('session_id') if payload else None
+
+        response = api_client.request(method, url, session_id, headers=JSON_HEADERS, data=payload, timeout=timeout)
+        if response.status_code == HTTPStatus.NOT_FOUND.value:
+            raise NDOP_FunctionNotFoundError(f'{function_name} is not supported')
+        if response.status_code != HTTPStatus.OK.value:
+            app.logger.info(f'ERROR: aws_lambda_invoke: func={function_name}: status_code={response.status_code}')
+            return None
+        return response.json() if response.content else {}
+
+
+TRANSPORTS = {
+    'lambda': LambdaTransport,
+    'http': HttpTransport,
+}
+
+
+class StateModelInvoker:
+    """Reads and writes the backend's state model for a session
+
+    Created once per process. STATE_MODEL_TRANSPORT picks how the state model
+    functions are reached, 'lambda' (the default) or 'http' for the NDOP mock.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.reset_supported = False
+
+    def init_app(self, app):
+        self.transport = TRANSPORTS[app.config.get("STATE_MODEL_TRANSPORT", "lambda")](app.config)
+        self.reset_supported = app.config.get("STATE_MODEL_RESET", False)
+
+    def invoke(self, function_name, payload):
+        """Invokes a state model function, waiting for and returning its result
+
+        The invocation draws down the request's deadline like any other backend call.
+        """
+        app.logger.info(f"aws_lambda_invoke: {function_name}")
+
+        # Raises DeadlineExceeded rather than invoke once the request has no time left
+        timeout = deadline.timeout_for(function_name)
+
+        return self.transport.invoke(function_name, payload, timeout)
+
+    def get(self, session_id):
+        return self.invoke('get-state-model', json.dumps({'session_id': session_id}))
+
+    def put(self, state_model_json):
+        return self.invoke('put-state-model', state_model_json)
+
+    def reset(self, session_id):
+        """Resets the session's state model to KEPT_FIELDS in a single call
+
+        Only tried where STATE_MODEL_RESET is set.
+
+        Returns:
+            bool: False if the reset is off, the backend has no reset function or
+                the reset failed with one of the transport's errors, in which case
+                the state model has to be read and written back instead
+        """
+        if not self.reset_supported:
+            return False
+
+        try:
+            result = self.invoke('reset-state-model', json.dumps({'session_id': session_id, 'keep': KEPT_FIELDS}))
+        except NDOP_FunctionNotFoundError:
+            app.logger.info("state model reset not supported, reading and writing the state model instead")
+            self.reset_supported = False
+            return False
+        except self.transport.errors() as e:
+            app.logger.error("error while resetting state model", {'exception_type': type(e).__name__})
+            return False
+
+        if result is None:
+            app.logger.error("error while resetting state model")
+            return False
+        return True
+
+
+state_model = StateModelInvoker()
@@ -0,0 +1,26 @@
+import threading
+from collections import deque
+
+
+class RollingWindow:
+    """The most recent observations of a value, for percentiles that follow recent behaviour"""
+
+    def __init__(self, size=200):
+        self.lock = threading.Lock()
+        self.values = deque(maxlen=size)
+
+    def add(self, value):
+        with self.lock:
+            self.values.append(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def percentile(self, percent):
+        """Returns the given percentile of the window, or None when nothing has been observed"""
+        with self.lock:
+            values = sorted(self.values)
+        if not values:
+            return None
+        index = min(len(values) - 1, int(len(values) * percent / 100))
+        return values[index]
@@ -0,0 +1,102 @@
+import logging
+import re
+import time
+import uuid
+
+from flask import g, request, has_app_context
+
+from ndopapp.metrics import outcome_of
+
+
+logger = logging.getLogger("flask.app")
+
+# W3C trace context, https://www.w3.org/TR/trace-context/
+TRACEPARENT = "traceparent"
+TRACEPARENT_FORMAT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    """A timed piece of work within a trace, logged as a "span" line when finished"""
+
+    def __init__(self, trace_id, name, kind, parent_id=None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_time = time.time()
+        self.started = time.monotonic()
+        self.finished = False
+
+    def headers(self):
+        """Headers passing the trace on to a backend call made within this span"""
+        return {TRACEPARENT: f"00-{self.trace_id}-{self.span_id}-01"}
+
+    def finish(self, outcome, **attributes):
+        if self.finished:
+            return
+        self.finished = True
+        logger.info("span", {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'span_name': self.name,
+            'span_kind': self.kind,
+            'outcome': outcome,
+            'start_time': round(self.start_time, 3),
+            'duration_ms': round((time.monotonic() - self.started) * 1000, 1),
+            **attributes,
+        })
+
+
+def init_app(app):
+    """Traces each request when TRACING is set
+
+    Every controller gets a span, continuing the trace of an incoming traceparent
+    header if there is one, and every API call and lambda invocation it makes gets
+    a span of its own with the controller's as its parent.
+    """
+    if not app.config.get("TRACING"):
+        return
+
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(abandon_request)
+
+
+def start_request():
+    trace_id, parent_id = uuid.uuid4().hex, None
+    match = TRACEPARENT_FORMAT.match(request.headers.get(TRACEPARENT, ""))
+    if match:
+        trace_id, parent_id = match.groups()
+
+    endpoint = request.url_rule.endpoint if request.url_rule else "unmatched"
+    g.trace_span = Span(trace_id, endpoint, "controller", parent_id)
+
+
+def finish_request(response):
+    span = g.get("trace_span")
+    if span is not None:
+        span.finish(outcome_of(response.status_code), method=request.method, status=response.status_code)
+    return response
+
+
+def abandon_request(exception=None):
+    span = g.get("trace_span")
+    if span is not None:
+        span.finish("error", method=request.method)
+
+
+def start_span(kind, name):
+    """Starts a span for a backend call, or returns None if the request isn't traced"""
+    if not has_app_context():
+        return None
+    parent = g.get("trace_span")
+    if parent is None:
+        return None
+    return Span(parent.trace_id, name, kind, parent.span_id)
+
+
+def finish_span(span, outcome):
+    if span is not None:
+        span.finish(outcome)
@@ -1,15 +1,23 @@
 import functools
-import requests
 import json
-import boto3
+import threading
+import time
 from http import HTTPStatus
 
-from flask import request, current_app as app, render_template, session
+from flask import request, current_app as app, render_template, session, g
 from flask.views import View
 
-from ndopapp import routes
+from ndopapp import routes, concurrency, servertiming
+from ndopapp.cache import session_cache
+from ndopapp.client import api_client, ACCEPT_JSON_HEADERS
+from ndopapp.exceptionlog import exception_log
+from ndopapp.models import NDOP_SessionExpiredError
+from ndopapp.statemodel import state_model, function_arn
 import traceback
 
+# Exceptions a prefetch logs, held back until its session is known to be valid
+held_exceptions = threading.local()
+
 
 class TemplateView(View):
     methods = ['GET']
@@ -55,13 +63,108 @@ def check_session(func):
     return check_session_wrapper
 
 
+def check_session_optimistically(func):
+    """Behaves as check_session unless OPTIMISTIC_SESSION_CHECK is set, in which case
+    the /checksession call is skipped and the controller's own backend call rejecting
+    the session cookie is treated as the session having expired"""
+    @functools.wraps(func)
+    def check_session_optimistically_wrapper(*args):
+        if not app.config.get("OPTIMISTIC_SESSION_CHECK"):
+            return check_session(func)(*args)
+
+        session_id = request.cookies.get('session_id_nojs')
+        if not session_id or session_cache.get(session_id) is False:
+            return render_template('session-expired.html', routes=routes)
+
+        g.optimistic_session_check = True
+        try:
+            return func(session_id, *args)
+        except NDOP_SessionExpiredError:
+            app.logger.info("session rejected by backend")
+            session_cache.put(session_id, False)
+            return render_template('session-expired.html', routes=routes)
+
+    return check_session_optimistically_wrapper
+
+
+def check_session_concurrently(prefetch, unless=None):
+    """Behaves as check_session_optimistically, but when CONCURRENT_SESSION_CHECK is set
+    prefetch(session_id) is issued at the same time as the /checksession call. The
+    controller collects its result through prefetched
+
+    Exceptions the prefetch logs are only logged once the session is found to be
+    valid, as an expired session is as likely to fail the prefetch as the check.
+
+    Args:
+        unless (callable): Returns True when the controller will not need the prefetch
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def check_session_concurrently_wrapper(*args):
+            if app.config.get("OPTIMISTIC_SESSION_CHECK") or not app.config.get("CONCURRENT_SESSION_CHECK") \
+                    or (unless is not None and unless()):
+                return check_session_optimistically(func)(*args)
+
+            session_id = request.cookies.get('session_id_nojs')
+            # A session already known to be dead is not worth a prefetch the backend will only reject
+            if not session_id or session_cache.get(session_id) is False:
+                return render_template('session-expired.html', routes=routes)
+
+            held = []
+            executor = concurrency.request_executor()
+            session_check, prefetch_call = executor.join(
+                executor.submit(is_session_valid, session_id),
+                executor.submit(holding_exceptions(prefetch, held), session_id)
+            )
+            if not session_check.result():
+                return render_template('session-expired.html', routes=routes)
+
+            for exception in held:
+                log_safe_exception(exception)
+            g.prefetched = {(prefetch, session_id): prefetch_call}
+            return func(session_id, *args)
+
+        return check_session_concurrently_wrapper
+    return decorator
+
+
+def holding_exceptions(func, held):
+    """Wraps func so the exceptions it would log with log_safe_exception are added to held instead"""
+    @functools.wraps(func)
+    def holding_exceptions_wrapper(*args, **kwargs):
+        held_exceptions.exceptions = held
+        try:
+            return func(*args, **kwargs)
+        finally:
+            held_exceptions.exceptions = None
+
+    return holding_exceptions_wrapper
+
+
+def prefetched(func, session_id):
+    """Returns func(session_id), reusing the call check_session_concurrently already made if there was one"""
+    prefetch_call = g.get('prefetched', {}).pop((func, session_id), None)
+    if prefetch_call is not None:
+        return prefetch_call.result()
+    return func(session_id)
+
+
 def is_session_valid(session_id):
     if not session_id:
         return False
-    headers = {"Accept": "application/json"}
-    cookies = dict(session_id=session_id)
-    response = requests.get(url=app.config["CHECK_SESSION_URL"], headers=headers, cookies=cookies)
-    return json.loads(response.text).get('valid')
+
+    started = time.monotonic()
+    valid = session_cache.get(session_id)
+    if valid is None:
+        response = api_client.get(app.config["CHECK_SESSION_URL"], session_id, headers=ACCEPT_JSON_HEADERS)
+        body = json.loads(response.text)
+        valid = bool(body.get('valid'))
+        # Only a real answer is cached, a gateway error says nothing about the session
+        if response.status_code == HTTPStatus.OK.value and 'valid' in body:
+            session_cache.put(session_id, valid)
+
+    servertiming.record("session-check", time.monotonic() - started)
+    return valid
 
 
 def ensure_safe_redirect_url(target):
@@ -83,13 +186,23 @@ def ensure_safe_redirect_url(target):
 
 def log_safe_exception(exception):
     """logs the minimum details needed to debug an exception, and not the full exception to avoid leaking patient 
-    confidential information"""
+    confidential information. Repeats of an exception already logged are only counted, see exceptionlog"""
+
+    held = getattr(held_exceptions, 'exceptions', None)
+    if held is not None:
+        held.append(exception)
+        return
+
+    exception_fingerprint = exception_log.occurred(exception)
+    if exception_fingerprint is None:
+        return
 
     exception_type = type(exception).__name__
     exception_traceback = exception.__traceback__
     exception_traceback_summary = traceback.extract_tb(exception_traceback).format()
 
     exception_info = {'exception_type': exception_type, 
+                      'exception_fingerprint': exception_fingerprint,
                       'exception_traceback_summary': exception_traceback_summary}
 
     exception_message = getattr(exception, 'safe_message', None)
@@ -117,38 +230,25 @@ def clean_state_model_locally(state_model_json):
 
 
 def get_full_aws_lambda_function_name(function_name):
-    return "arn:aws:lambda:{}:{}:function:{}-{}".format(
-        str(app.config.get("AWS_DEFAULT_REGION")),
-        str(app.config.get("AWS_ACCOUNT_ID")),
-        str(app.config.get("AWS_ENV_NAME")),
-        function_name,
-    )
+    return function_arn(app.config, function_name)
 
 
 def aws_lambda_invoke(func, data):
-    app.logger.info(f"aws_lambda_invoke: {func}")
-
-    resp = boto3.client('lambda').invoke(
-        FunctionName=get_full_aws_lambda_function_name(func),
-        Payload=data
-    )
-
-    status_code = resp['StatusCode']
-    payload = json.loads(resp['Payload'].read())
-    if status_code is not HTTPStatus.OK.value:
-        app.logger.info(f'ERROR: aws_lambda_invoke: func={func}: status_code={status_code}')
-        return None
-    return payload
+    return state_model.invoke(func, data)
 
 
 def aws_lambda_get_state_model():
     session_id = request.cookies.get('session_id_nojs', '')
-    data = json.dumps({'session_id': session_id})
-    return aws_lambda_invoke(func='get-state-model', data=data)
+    return state_model.get(session_id)
 
 
 def aws_lambda_put_state_model(state_model_json):
-    return aws_lambda_invoke(func='put-state-model', data=state_model_json)
+    return state_model.put(state_model_json)
+
+
+def aws_lambda_reset_state_model():
+    session_id = request.cookies.get('session_id_nojs', '')
+    return state_model.reset(session_id)
 
 
 def clean_state_model():
@@ -159,8 +259,17 @@ def clean_state_model():
 
     Such method of 'clearning state model' was implemented in JS version in file:
     ndop-front-end/screens/lookup-failure-error/renderer-ES6.js 
+
+    Where the backend has a reset-state-model function the state model is reset
+    in that single call instead, and it is only read and written back without one.
+
+    Both calls are waited for. A write left running after the response could
+    land after the session's next PDS search had written its results.
     """
 
+    if aws_lambda_reset_state_model():
+        return True
+
     state_model_json = aws_lambda_get_state_model()
     if state_model_json:
         clear_state_model = clean_state_model_locally(state_model_json)
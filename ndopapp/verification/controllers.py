@@ -148,7 +148,7 @@ def enter_your_code(session_id):
 
 
 @verification_blueprint.route(routes.get_raw("verification.resend_code"), methods=("POST",))
-@utils.check_session
+@utils.check_session_optimistically
 def resend_code(session_id):
     result = resend_code_by_pds(session_id)
 
@@ -6,6 +6,7 @@ from http import HTTPStatus
 from flask import current_app
 
 from ndopapp import routes, constants
+from ndopapp.client import api_client
 from ndopapp.models import NDOP_RequestError
 from ndopapp.utils import log_safe_exception
 
@@ -13,13 +14,9 @@ from ndopapp.utils import log_safe_exception
 def is_otp_verified_by_pds(session_id, code):
 
     code_json = json.dumps({'enterOtpInput': str(code)})
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
 
     try:
-        pds_search_request = requests.post(
-            url=current_app.config["VERIFY_CODE_URL"], headers=headers, data=code_json, cookies=cookies
-        )
+        pds_search_request = api_client.post(current_app.config["VERIFY_CODE_URL"], code_json, session_id)
 
         pds_search_request.raise_for_status()
 
@@ -50,13 +47,8 @@ def is_otp_verified_by_pds(session_id, code):
 def resend_code_by_pds(session_id):
     result = constants.UNKNOWN_RESULT
 
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
-
     try:
-        pds_search_request = requests.get(
-            url=current_app.config["PDS_RESEND_CODE_URL"], headers=headers, cookies=cookies
-        )
+        pds_search_request = api_client.get(current_app.config["PDS_RESEND_CODE_URL"], session_id)
 
         pds_search_request.raise_for_status()
 
@@ -84,13 +76,9 @@ def request_code_by_pds(session_id, otp_delivery_type):
     result = constants.OTP_REQUEST_FAILURE
 
     json_content = json.dumps({'otp_delivery_type': str(otp_delivery_type)})
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
 
     try:
-        pds_search_request = requests.post(
-            url=current_app.config["PDS_REQUEST_CODE_URL"], headers=headers, data=json_content, cookies=cookies
-        )
+        pds_search_request = api_client.post(current_app.config["PDS_REQUEST_CODE_URL"], json_content, session_id)
 
         pds_search_request.raise_for_status()
 
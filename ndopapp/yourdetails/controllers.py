@@ -12,7 +12,9 @@ from flask import (
     current_app as app
 )
 
-from ndopapp import routes, constants, utils
+from ndopapp import routes, constants, utils, polling
+from ndopapp.cache import session_cache
+from ndopapp.pagecache import page_cache
 from ndopapp.utils import TemplateView
 from ndopapp.routes import redirect_to_route
 
@@ -313,7 +315,7 @@ def set_your_preference(session_id):
     if session.get('pds_opted_out') not in ('active', 'inactive', constants.GET_PREFERENCE_EMPTY):
         session['pds_opted_out'] = get_current_preference(session_id)
         if session.get('pds_opted_out') == constants.GET_PREFERENCE_INCOMPLETE:
-            return render_template(
+            return page_cache.render(
                 'waiting-for-results.html',
                 waiting_message=constants.PDS_SEARCH_WAITING_MESSAGE
             )
@@ -335,17 +337,15 @@ def set_your_preference(session_id):
 
 
 @yourdetails_blueprint.route(routes.get_raw("verification.waiting_for_results"))
-@utils.check_session
+@utils.check_session_concurrently(check_status_of_pds_search_result, unless=lambda: polling.timed_out(session))
 def waiting_for_results(session_id):
     search_result = None
 
     if not session.get('timeout_threshold'):
         session['timeout_threshold'] = int(time.time()) + int(app.config["PDS_REQUEST_TIMEOUT"])
-    elif int(session.get('timeout_threshold')) <= int(time.time()):
+    elif polling.timed_out(session):
         search_result = constants.PDS_REQUEST_TIMEOUT
-
-    if not search_result:
-        search_result = check_status_of_pds_search_result(session_id)
+    polling.track(session, 'pds_search')
 
     result_redirects = {
         'success': ("verification.verification_option", False),
@@ -355,28 +355,40 @@ def waiting_for_results(session_id):
         constants.PDS_REQUEST_TIMEOUT: ('main.generic_error', False)
     }
 
+    if not search_result:
+        search_result = polling.long_poll(
+            check_status_of_pds_search_result,
+            session_id,
+            is_complete=lambda result: result in result_redirects,
+            result=utils.prefetched(check_status_of_pds_search_result, session_id),
+            until=session.get('timeout_threshold')
+        )
+
     if search_result in result_redirects:
         redirect_controller, clean_state_model = result_redirects[search_result]
 
+        polling.finish(session, 'pds_search', completed=search_result != constants.PDS_REQUEST_TIMEOUT)
+
         if clean_state_model and not utils.clean_state_model():
             return redirect_to_route('main.generic_error')
 
         session.pop('timeout_threshold', None)
         return redirect_to_route(redirect_controller)
 
-    return render_template(
+    return page_cache.render(
         "waiting-for-results.html",
         waiting_message=constants.PDS_SEARCH_WAITING_MESSAGE,
+        refresh_interval=polling.next_refresh_interval(session, 'pds_search'),
         routes=routes
     )
 
 
 @yourdetails_blueprint.route(routes.get_raw("yourdetails.review_your_choice"), methods=('GET', 'POST',))
-@utils.check_session
+@utils.check_session_concurrently(get_confirmation_delivery_details)
 def review_your_choice(session_id):
     user_details = UserDetails()
 
-    delivery_ret = get_confirmation_delivery_details(session_id)
+    delivery_ret = utils.prefetched(get_confirmation_delivery_details, session_id)
 
     if not delivery_ret or delivery_ret.get('method') not in ("sms", "email"):
         return redirect_to_route('main.generic_error')
@@ -397,28 +409,38 @@ def review_your_choice(session_id):
 
 
 @yourdetails_blueprint.route(routes.get_raw("yourdetails.store_preference_result"))
-@utils.check_session
+@utils.check_session_optimistically
 def store_preference_result(session_id):
     if not session.get('timeout_threshold'):
         session['timeout_threshold'] = int(time.time()) + int(app.config["PDS_REQUEST_TIMEOUT"])
     elif int(session.get('timeout_threshold')) <= int(time.time()):
         session.pop('timeout_threshold', None)
+        polling.finish(session, 'store_preference', completed=False)
         return redirect_to_route('main.generic_error')
+    polling.track(session, 'store_preference')
 
-    result = get_store_preference_result(session_id)
+    result = polling.long_poll(
+        get_store_preference_result,
+        session_id,
+        is_complete=lambda result: result in ("success", "failure"),
+        until=session.get('timeout_threshold')
+    )
 
     if result == "success":
         session['is_successfully_stored'] = True
         session.pop('timeout_threshold', None)
+        polling.finish(session, 'store_preference')
         return redirect_to_route('yourdetails.thank_you')
 
     if result == "failure":
         session.pop('timeout_threshold', None)
+        polling.finish(session, 'store_preference')
         return redirect_to_route('yourdetails.choice_not_saved')
 
-    return render_template(
+    return page_cache.render(
         "waiting-for-results.html",
         waiting_message=constants.PREF_WAITING_MESSAGE,
+        refresh_interval=polling.next_refresh_interval(session, 'store_preference'),
         routes=routes
     )
 
@@ -431,6 +453,7 @@ def thank_you():
 
     user_details = UserDetails()
     session.clear()
+    session_cache.invalidate(request.cookies.get('session_id_nojs'))
 
     response = make_response(render_template("thank-you.html", user_details=user_details, routes=routes))
     response.set_cookie("session_id_nojs", '', max_age=0)
@@ -6,6 +6,7 @@ from http import HTTPStatus
 from flask import session, g, current_app as app
 
 from ndopapp import constants
+from ndopapp.client import api_client
 from ndopapp.models import NDOP_RequestError
 from ndopapp.utils import log_safe_exception, clean_state_model
 
@@ -51,9 +52,7 @@ def get_session_id():
 
     try:
         app.logger.info("creating new session")
-        create_session_request = requests.get(
-            url=app.config["CREATE_SESSION_URL"]
-        )
+        create_session_request = api_client.get(app.config["CREATE_SESSION_URL"], headers=None)
         create_session_request.raise_for_status()
 
         if HTTPStatus(create_session_request.status_code) is HTTPStatus.OK:
@@ -84,20 +83,15 @@ def do_pds_search(user_details, session_id):
         "postcode": user_details.postcode
     })
 
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
-
     #TDBAT-415 - clean state model before each PDS search
     clean_state_model()
 
     try:
         app.logger.info("submitting pds search")
-        pds_search_request = requests.post(
-            url=app.config["PDS_SEARCH_URL"],
-            headers=headers,
-            data=user_json,
-            cookies=cookies,
-            timeout=app.config["PDS_REQUEST_TIMEOUT"],
+        pds_search_request = api_client.post(
+            app.config["PDS_SEARCH_URL"],
+            user_json,
+            session_id,
         )
 
         pds_search_request.raise_for_status()
@@ -123,16 +117,12 @@ def do_pds_search(user_details, session_id):
 
 def check_status_of_pds_search_result(session_id):
     search_result = ""
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
-
     try:
         app.logger.info("submitting pds search result request")
-        pds_search_result_request = requests.get(
-            url=app.config["PDS_SEARCH_RESULT_URL"],
-            headers=headers,
-            cookies=cookies,
-            timeout=app.config["PDS_REQUEST_TIMEOUT"],
+        pds_search_result_request = api_client.get(
+            app.config["PDS_SEARCH_RESULT_URL"],
+            session_id,
+            retry=True,
         )
         pds_search_result_request.raise_for_status()
 
@@ -173,13 +163,8 @@ def get_current_preference(session_id):
     """retunrs False if not successful """
     app.logger.info("getting current preference")
 
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
-
     try:
-        preference_result_request = requests.get(
-            url=app.config["PREFERENCE_RESULT_URL"], headers=headers, cookies=cookies
-        )
+        preference_result_request = api_client.get(app.config["PREFERENCE_RESULT_URL"], session_id, retry=True)
         preference_result_request.raise_for_status()
 
         if HTTPStatus(preference_result_request.status_code) is HTTPStatus.OK:
@@ -199,13 +184,8 @@ def get_current_preference(session_id):
 
 
 def get_confirmation_delivery_details(session_id):
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
-
     try:
-        pds_search_result_request = requests.get(
-            url=app.config["GET_CONFIRMATION_DELIVERY_METHOD"], headers=headers, cookies=cookies
-        )
+        pds_search_result_request = api_client.get(app.config["GET_CONFIRMATION_DELIVERY_METHOD"], session_id, retry=True)
         pds_search_result_request.raise_for_status()
 
         if HTTPStatus(pds_search_result_request.status_code) is HTTPStatus.OK:
@@ -231,14 +211,10 @@ def get_confirmation_delivery_details(session_id):
 def set_preference(user_details, session_id):
     app.logger.info("setting preference")
 
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
     user_json = json.dumps({"preference" : user_details.preference})
 
     try:
-        preference_result_request = requests.post(
-            url=app.config["SET_PREFERENCE_URL"], headers=headers, data=user_json, cookies=cookies
-        )
+        preference_result_request = api_client.post(app.config["SET_PREFERENCE_URL"], user_json, session_id)
         preference_result_request.raise_for_status()
 
         if HTTPStatus(preference_result_request.status_code) is HTTPStatus.OK:
@@ -257,15 +233,8 @@ def set_preference(user_details, session_id):
 def get_store_preference_result(session_id):
     app.logger.info("storing preference result")
 
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
-
     try:
-        preference_result_request = requests.get(
-            url=app.config["SET_PREFERENCE_RESULT_URL"],
-            headers=headers,
-            cookies=cookies
-        )
+        preference_result_request = api_client.get(app.config["SET_PREFERENCE_RESULT_URL"], session_id)
         preference_result_request.raise_for_status()
         app.logger.info("store_preference_result", {"status_code": preference_result_request.status_code})
 
@@ -286,15 +255,8 @@ def get_store_preference_result(session_id):
 def confirm_preference(session_id):
     app.logger.info("confirming preference result")
 
-    headers = {"Content-type": "application/json"}
-    cookies = dict(session_id=session_id)
-
     try:
-        preference_result_request = requests.get(
-            url=app.config["CONFIRMATION_SENDER_URL"],
-            headers=headers,
-            cookies=cookies
-        )
+        preference_result_request = api_client.get(app.config["CONFIRMATION_SENDER_URL"], session_id)
         preference_result_request.raise_for_status()
 
         if HTTPStatus(preference_result_request.status_code) is HTTPStatus.OK:
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Times the logging a request does, as seen by the request
+
+    python scripts/benchmark_logging.py [requests] [write delay in microseconds]
+
+Each request logs LINES_PER_REQUEST lines, between which it waits on a backend
+call for BACKEND_CALL_SECONDS, then flushes the logs as the app does when a
+request is torn down. Log lines are written to a temporary file rather than the
+terminal. A write delay stands in for a slow or backed up stdout, as when
+Lambda's log shipping falls behind.
+
+It also times making a single log record within a request, with the request's
+fields cached on g as they are, and worked out again for every record, and
+formatting one with PipeFormatter against the json.dumps based formatter it
+replaced, checking both give the same lines.
+"""
+import collections
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask import g  # noqa: E402
+
+from ndopapp import create_app  # noqa: E402
+from ndopapp.logging import (  # noqa: E402
+    install_logger, flush_logs, stop_listener, record_factory, PipeFormatter, LOG_FIELDS
+)
+
+
+LINES_PER_REQUEST = 8
+BACKEND_CALL_SECONDS = 0.001
+RECORDS = 20000
+
+HEADERS = {
+    'X-Forwarded-For': '1.1.1.1, 2.2.2.2, 3.3.3.3, 4.4.4.4',
+    'X-AMZ-REQUEST-ID': 'c0ffee00-0000-4000-8000-000000000000',
+    'X-AMZ-STAGE': 'benchmark',
+    'User-Agent': 'benchmark',
+}
+
+
+class SlowSink:
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def fake_request(app):
+    """Seconds spent logging by a request, its backend calls aside"""
+    started = time.perf_counter()
+    with app.test_request_context(headers=HEADERS):
+        for number in range(LINES_PER_REQUEST):
+            app.logger.info("rendering page", {'page': 'yourdetails.your_details', 'number': number})
+            time.sleep(BACKEND_CALL_SECONDS)
+        flush_logs()
+    return time.perf_counter() - started - LINES_PER_REQUEST * BACKEND_CALL_SECONDS
+
+
+def benchmark(name, app, requests, queue_size):
+    install_logger(queue_size)
+    fake_request(app)  # warm up
+
+    spent = sorted(fake_request(app) for _ in range(requests))
+    print(f"{name:<12} median {spent[len(spent) // 2] * 1e3:6.2f}ms, "
+          f"p95 {spent[int(len(spent) * 0.95)] * 1e3:6.2f}ms of logging per request")
+
+
+def benchmark_record_factory(app):
+    with app.test_request_context(headers=HEADERS):
+        for name, cached in (("recomputed", False), ("cached", True)):
+            started = time.perf_counter()
+            for _ in range(RECORDS):
+                if not cached:
+                    g.pop('log_context', None)
+                record_factory("flask.app", logging.INFO, __file__, 0, "rendering page", None, None)
+            spent = time.perf_counter() - started
+            print(f"{'fields ' + name:<18} {spent / RECORDS * 1e6:6.2f}us per record")
+
+
+class JsonDumpsPipeFormatter(PipeFormatter):
+    """PipeFormatter as it was, encoding every value with json.dumps"""
+
+    def ipairs(self, record):
+        for field in self.fields:
+            alias = field
+            if not isinstance(field, str):
+                field, alias = field
+            yield alias, getattr(record, field, "")
+
+        if isinstance(record.args, collections.Mapping):
+            yield from record.args.items()
+
+    def formatMessage(self, record):
+        return " | ".join(f"{k}={json.dumps(v)}" for k, v in self.ipairs(record))
+
+
+def benchmark_formatter(app):
+    with app.test_request_context(headers=HEADERS):
+        record = record_factory("flask.app", logging.INFO, __file__, 0, "rendering page",
+                                ({'page': 'yourdetails.your_details', 'template': 'your-details.html'},), None)
+
+    lines = {}
+    for name, formatter_class in (("json.dumps", JsonDumpsPipeFormatter), ("PipeFormatter", PipeFormatter)):
+        formatter = formatter_class(LOG_FIELDS)
+        started = time.perf_counter()
+        for _ in range(RECORDS):
+            line = formatter.format(record)
+        spent = time.perf_counter() - started
+        lines[name] = line
+        print(f"{name:<18} {spent / RECORDS * 1e6:6.2f}us per record formatted")
+
+    assert len(set(lines.values())) == 1, lines
+
+
+def main(requests, write_delay):
+    app = create_app('ndopapp.config.Config')
+    benchmark_record_factory(app)
+    benchmark_formatter(app)
+
+    with tempfile.TemporaryFile('w') as sink:
+        stderr, sys.stderr = sys.stderr, SlowSink(sink, write_delay)
+        try:
+            benchmark("synchronous", app, requests, 0)
+            benchmark("queued", app, requests, 10000)
+        finally:
+            stop_listener()
+            sys.stderr = stderr
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         int(sys.argv[2]) / 1e6 if len(sys.argv) > 2 else 0)
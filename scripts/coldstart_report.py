@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""Cold starts the app in a fresh process and prints where the time went
+
+    python scripts/coldstart_report.py [config object]
+
+Shows each phase of importing ndopapp and create_app, and the packages that took
+longest to import, see ndopapp.coldstart.
+"""
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def main(config_object):
+    subprocess.run([
+        sys.executable, "-c",
+        f"from ndopapp import create_app, coldstart; create_app({config_object!r}); coldstart.print_report()"
+    ], cwd=ROOT, env=dict(os.environ, COLD_START_PROFILE="1"), check=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'ndopapp.config.Config')
@@ -118,3 +118,13 @@ def pds_search_results_callback(request, context):
     context.status_code = HTTPStatus.OK.value
     body = json.dumps({"search_result": "success", "sms": USER_MOBILE})
     return body
+
+
+class FakeClock:
+    """A clock that only moves when a test sets now"""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,69 @@
+import unittest
+
+from ndopapp.cache import TTLCache, SessionValidityCache
+from tests.common import FakeClock
+
+
+class TTLCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(maxsize=2, clock=self.clock)
+
+    def test_entries_expire_after_ttl(self):
+        """Entries are returned until their ttl has passed"""
+        self.cache.set('key', 'value', ttl=5)
+        self.clock.now = 4
+        self.assertEqual('value', self.cache.get('key'))
+        self.clock.now = 5
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_zero_ttl_not_stored(self):
+        """A ttl of zero disables caching"""
+        self.cache.set('key', 'value', ttl=0)
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_least_recently_used_evicted(self):
+        """The least recently used entry is evicted once maxsize is reached"""
+        self.cache.set('a', 1, ttl=10)
+        self.cache.set('b', 2, ttl=10)
+        self.cache.get('a')
+        self.cache.set('c', 3, ttl=10)
+
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_hits_and_misses_counted(self):
+        """Hits and misses are counted"""
+        self.cache.set('a', 1, ttl=10)
+        self.cache.get('a')
+        self.cache.get('b')
+        self.assertEqual({'size': 1, 'hits': 1, 'misses': 1}, self.cache.stats())
+
+    def test_invalidate(self):
+        """Invalidated entries are no longer returned"""
+        self.cache.set('a', 1, ttl=10)
+        self.cache.invalidate('a')
+        self.cache.invalidate('not cached')
+        self.assertIsNone(self.cache.get('a'))
+
+
+class SessionValidityCacheTests(unittest.TestCase):
+
+    def test_invalid_sessions_cached_for_longer(self):
+        """Valid and invalid results use their own ttl"""
+        clock = FakeClock()
+        cache = SessionValidityCache(valid_ttl=10, invalid_ttl=60)
+        cache.clock = clock
+
+        cache.put('valid', True)
+        cache.put('invalid', False)
+        clock.now = 30
+
+        self.assertIsNone(cache.get('valid'))
+        self.assertIs(False, cache.get('invalid'))
+
+
+if __name__ == '__main__':
+    unittest.main()
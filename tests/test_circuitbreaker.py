@@ -0,0 +1,151 @@
+import unittest
+from http import HTTPStatus
+from unittest.mock import patch
+
+import requests
+import requests_mock
+
+from ndopapp import create_app, routes
+from ndopapp.circuitbreaker import CircuitBreaker, breakers, CLOSED, OPEN, HALF_OPEN
+from ndopapp.client import api_client
+from ndopapp.models import NDOP_ServiceUnavailableError
+from tests import common
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    """ Tests for the circuit breaker state machine """
+
+    def setUp(self):
+        self.clock = common.FakeClock()
+        self.breaker = CircuitBreaker('patientsearchresult', window=4, minimum_calls=4, error_rate=0.5,
+                                      slow_call_seconds=5, slow_call_rate=0.75, open_seconds=30,
+                                      clock=self.clock)
+
+    def record(self, *outcomes):
+        for failed, seconds in outcomes:
+            generation = self.breaker.before_call()
+            self.breaker.after_call(failed, seconds, generation)
+
+    def test_opens_on_error_rate(self):
+        """The breaker opens once the error rate over the window reaches the threshold"""
+        self.record((False, 0.1), (True, 0.1), (False, 0.1))
+        self.assertEqual(CLOSED, self.breaker.state)
+
+        self.record((True, 0.1))
+        self.assertEqual(OPEN, self.breaker.state)
+        with self.assertRaises(NDOP_ServiceUnavailableError):
+            self.breaker.before_call()
+
+    def test_opens_on_slow_calls(self):
+        """The breaker opens once enough calls succeed too slowly"""
+        self.record((False, 6), (False, 6), (False, 6), (False, 0.1))
+        self.assertEqual(OPEN, self.breaker.state)
+
+    def test_half_open_allows_single_trial(self):
+        """After open_seconds a single trial call is let through"""
+        self.record(*[(True, 0.1)] * 4)
+        self.clock.now = 30
+
+        self.breaker.before_call()
+        self.assertEqual(HALF_OPEN, self.breaker.state)
+        with self.assertRaises(NDOP_ServiceUnavailableError):
+            self.breaker.before_call()
+
+    def test_trial_success_closes(self):
+        """A successful trial call closes the breaker"""
+        self.record(*[(True, 0.1)] * 4)
+        self.clock.now = 30
+
+        self.record((False, 0.1))
+        self.assertEqual(CLOSED, self.breaker.state)
+        self.breaker.before_call()
+
+    def test_trial_failure_reopens(self):
+        """A failed trial call opens the breaker for another open_seconds"""
+        self.record(*[(True, 0.1)] * 4)
+        self.clock.now = 30
+
+        self.record((True, 0.1))
+        self.assertEqual(OPEN, self.breaker.state)
+        self.clock.now = 59
+        with self.assertRaises(NDOP_ServiceUnavailableError):
+            self.breaker.before_call()
+
+    def test_only_trial_decides_half_open(self):
+        """Calls that started before the trial don't close or reopen a half open breaker"""
+        self.record((False, 0.1), (False, 0.1), (False, 0.1))
+        before_opening = self.breaker.before_call()
+        self.record((True, 0.1), (True, 0.1))
+        self.assertEqual(OPEN, self.breaker.state)
+        self.clock.now = 30
+
+        trial = self.breaker.before_call()
+        self.breaker.after_call(False, 0.1, before_opening)
+        self.assertEqual(HALF_OPEN, self.breaker.state)
+
+        self.breaker.after_call(True, 0.1, trial)
+        self.assertEqual(OPEN, self.breaker.state)
+
+
+class ApiClientBreakerTests(unittest.TestCase):
+    """ Tests for circuit breaking in the NDOP API client """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config.update(BREAKER_MINIMUM_CALLS=2, BREAKER_WINDOW=2)
+        breakers.init_app(self.app)
+
+    def tearDown(self):
+        self.app = None
+
+    def test_failing_endpoint_fails_fast(self):
+        """Calls to an endpoint with an open breaker are not made"""
+        with requests_mock.Mocker() as mock:
+            mock.get(self.app.config['PREFERENCE_RESULT_URL'], status_code=HTTPStatus.BAD_GATEWAY.value)
+            mock.get(self.app.config['CHECK_SESSION_URL'], exc=requests.exceptions.ConnectTimeout)
+
+            for _ in range(2):
+                api_client.get(self.app.config['PREFERENCE_RESULT_URL'], common.SESSION_ID)
+                with self.assertRaises(requests.exceptions.ConnectTimeout):
+                    api_client.get(self.app.config['CHECK_SESSION_URL'], common.SESSION_ID)
+
+            with self.assertRaises(NDOP_ServiceUnavailableError):
+                api_client.get(self.app.config['PREFERENCE_RESULT_URL'], common.SESSION_ID)
+            with self.assertRaises(NDOP_ServiceUnavailableError):
+                api_client.get(self.app.config['CHECK_SESSION_URL'], common.SESSION_ID)
+            self.assertEqual(4, mock.call_count)
+
+        self.assertEqual({'getpreferenceresult': OPEN, 'checksession': OPEN}, breakers.states())
+
+    @patch('ndopapp.utils.is_session_valid', side_effect=NDOP_ServiceUnavailableError('circuit open'))
+    def test_service_busy_page(self, _):
+        """An open breaker serves the service busy page straight away"""
+        common.registerExceptionHandlers(self.app)
+        client = self.app.test_client()
+        client.set_cookie("test", common.SESSION_COOKIE_KEY, common.SESSION_ID)
+
+        response = client.get(routes.get_raw("verification.waiting_for_results"))
+
+        self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE.value, response.status_code)
+        self.assertEqual('30', response.headers['Retry-After'])
+        self.assertIn(b'Sorry, this service is busy', response.data)
+
+
+    @patch('ndopapp.utils.is_session_valid', side_effect=NDOP_ServiceUnavailableError('circuit open'))
+    def test_service_busy_page_with_flashed_messages(self, _):
+        """The service busy page is served even while flashed messages are waiting in the session"""
+        common.registerExceptionHandlers(self.app)
+        client = self.app.test_client()
+        client.set_cookie("test", common.SESSION_COOKIE_KEY, common.SESSION_ID)
+        with client.session_transaction() as session:
+            session['_flashes'] = [('message', 'Choose an option')]
+
+        response = client.get(routes.get_raw("verification.waiting_for_results"))
+
+        self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE.value, response.status_code)
+        self.assertEqual('30', response.headers['Retry-After'])
+        self.assertIn(b'Sorry, this service is busy', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
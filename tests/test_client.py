@@ -0,0 +1,121 @@
+import threading
+import time
+import unittest
+from http import HTTPStatus
+
+import requests_mock
+from flask import g
+
+from ndopapp import create_app
+from ndopapp.client import NdopApiClient, api_client, JSON_HEADERS
+from ndopapp.models import NDOP_SessionExpiredError
+from tests import common
+
+
+class NdopApiClientTests(unittest.TestCase):
+    """ Tests for the shared NDOP API client """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+
+    def tearDown(self):
+        self.app = None
+
+    def test_session_reused_between_calls(self):
+        """The same requests session is used for every call"""
+        session = api_client.session
+        with requests_mock.Mocker() as mock:
+            mock.get(requests_mock.ANY, text='{}')
+            api_client.get(self.app.config['CHECK_SESSION_URL'], common.SESSION_ID)
+            api_client.get(self.app.config['PDS_SEARCH_RESULT_URL'], common.SESSION_ID)
+        self.assertIs(session, api_client.session)
+
+    def test_init_app_configures_connection_pool(self):
+        """The connection pool is sized from the app config"""
+        self.app.config['API_POOL_MAXSIZE'] = 25
+        client = NdopApiClient()
+        client.init_app(self.app)
+
+        adapter = client.session.get_adapter('https://example.com')
+        self.assertEqual(25, adapter._pool_maxsize)
+
+    def test_session_cookie_and_headers_sent(self):
+        """The session id is sent as a cookie along with the json headers"""
+        with requests_mock.Mocker() as mock:
+            mock.get(requests_mock.ANY, text='{}')
+            api_client.get(self.app.config['CHECK_SESSION_URL'], common.SESSION_ID)
+
+            sent = mock.last_request
+            self.assertEqual(f'session_id={common.SESSION_ID}', sent.headers['Cookie'])
+            self.assertEqual(JSON_HEADERS['Content-type'], sent.headers['Content-type'])
+
+    def test_response_cookies_not_shared_between_users(self):
+        """Cookies set by the API are readable from the response but not sent on later calls"""
+        with requests_mock.Mocker() as mock:
+            mock.get(self.app.config['CREATE_SESSION_URL'], text=common.create_session_callback)
+            mock.get(self.app.config['CHECK_SESSION_URL'], status_code=HTTPStatus.OK.value, text='{}')
+
+            response = api_client.get(self.app.config['CREATE_SESSION_URL'], headers=None)
+            self.assertEqual(common.SESSION_ID, response.cookies.get('session_id'))
+
+            api_client.get(self.app.config['CHECK_SESSION_URL'])
+            self.assertNotIn('Cookie', mock.last_request.headers)
+
+    def test_rejected_session_raises_in_optimistic_mode(self):
+        """A rejected session cookie raises when the session was not checked up front"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(self.app.config['GET_CONFIRMATION_DELIVERY_METHOD'], status_code=HTTPStatus.FORBIDDEN.value)
+
+            api_client.get(self.app.config['GET_CONFIRMATION_DELIVERY_METHOD'], common.SESSION_ID)
+
+            g.optimistic_session_check = True
+            with self.assertRaises(NDOP_SessionExpiredError):
+                api_client.get(self.app.config['GET_CONFIRMATION_DELIVERY_METHOD'], common.SESSION_ID)
+
+    def test_result_statuses_not_treated_as_rejected_session(self):
+        """Statuses an endpoint uses for its own results are returned as normal"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(self.app.config['PDS_SEARCH_RESULT_URL'], status_code=HTTPStatus.UNAUTHORIZED.value)
+            g.optimistic_session_check = True
+
+            response = api_client.get(self.app.config['PDS_SEARCH_RESULT_URL'], common.SESSION_ID)
+            self.assertEqual(HTTPStatus.UNAUTHORIZED.value, response.status_code)
+
+    def test_concurrent_polls_share_one_call(self):
+        """Concurrent GETs of a polled endpoint for the same session make a single API call"""
+        def respond(request, context):
+            give_up_at = time.monotonic() + 2
+            while api_client.in_flight.stats()['shared'] < 1 and time.monotonic() < give_up_at:
+                time.sleep(0.001)
+            return '{"search_result": "success"}'
+
+        responses = []
+        with requests_mock.Mocker() as mock:
+            mock.get(self.app.config['PDS_SEARCH_RESULT_URL'], text=respond)
+
+            def poll():
+                responses.append(api_client.get(self.app.config['PDS_SEARCH_RESULT_URL'], common.SESSION_ID))
+
+            threads = [threading.Thread(target=poll) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(2)
+
+            self.assertEqual(1, mock.call_count)
+        self.assertEqual(2, len(responses))
+        self.assertEqual({'in_flight': 0, 'made': 1, 'shared': 1}, api_client.in_flight.stats())
+
+    def test_posts_not_shared(self):
+        """Calls that change state are always made"""
+        with requests_mock.Mocker() as mock:
+            mock.post(requests_mock.ANY, text='{}')
+            api_client.post(self.app.config['SET_PREFERENCE_URL'], '{}', common.SESSION_ID)
+            api_client.post(self.app.config['SET_PREFERENCE_URL'], '{}', common.SESSION_ID)
+
+            self.assertEqual(2, mock.call_count)
+        self.assertEqual(0, api_client.in_flight.stats()['made'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from ndopapp import coldstart
+from ndopapp.config import TestConfig
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+COLD_START = """
+import json, sys
+from ndopapp import create_app, coldstart
+create_app('ndopapp.config.TestConfig')
+print(json.dumps({'seconds': coldstart.total_seconds(), 'phases': coldstart.report(), 'boto3': 'boto3' in sys.modules}))
+"""
+
+
+class ColdStartTests(unittest.TestCase):
+    """ Tests for the cold start report and budget """
+
+    @classmethod
+    def setUpClass(cls):
+        # Imports ndopapp and creates the app in a fresh process, as a cold start does
+        output = subprocess.run([sys.executable, "-c", COLD_START], cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, check=True).stdout
+        cls.cold_start = json.loads(output.decode().splitlines()[-1])
+
+    def test_within_budget(self):
+        """Importing ndopapp and create_app take no longer than COLD_START_BUDGET"""
+        self.assertLessEqual(self.cold_start['seconds'], TestConfig.COLD_START_BUDGET, self.cold_start['phases'])
+
+    def test_phases_reported(self):
+        """Each phase of the cold start is reported, in order"""
+        self.assertEqual(['imports', 'logging', 'config', 'extensions', 'blueprints'],
+                         [phase['phase'] for phase in self.cold_start['phases']])
+
+    def test_boto3_not_imported(self):
+        """boto3 is left to the first lambda invocation"""
+        self.assertFalse(self.cold_start['boto3'])
+
+    def test_phase_recorded_once(self):
+        """Only the first time a phase ends in the process is recorded"""
+        phases = dict(coldstart.phases)
+        try:
+            coldstart.begin()
+            coldstart.mark("test phase")
+            first = coldstart.phases["test phase"]
+            coldstart.mark("test phase")
+            self.assertIs(first, coldstart.phases["test phase"])
+        finally:
+            coldstart.phases.clear()
+            coldstart.phases.update(phases)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import threading
+import time
+import unittest
+
+from flask import g, request, session
+
+from ndopapp import create_app, concurrency
+from ndopapp.models import NDOP_RequestError
+
+
+class RequestExecutorTests(unittest.TestCase):
+    """ Tests for concurrent backend calls within a request """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+
+    def tearDown(self):
+        self.app = None
+
+    def test_calls_run_in_the_current_request_context(self):
+        """Submitted calls see the same request, session and g as the controller"""
+        def read_context():
+            session['written_by_worker'] = True
+            return request.path, g.marker, threading.current_thread().name
+
+        with self.app.test_request_context('/waitingforresults'):
+            g.marker = 'marker'
+            executor = concurrency.request_executor()
+            path, marker, thread_name = executor.gather(executor.submit(read_context))[0]
+
+            self.assertEqual('/waitingforresults', path)
+            self.assertEqual('marker', marker)
+            self.assertTrue(thread_name.startswith('ndop-fanout'))
+            self.assertTrue(session['written_by_worker'])
+
+    def test_calls_run_concurrently(self):
+        """The calls overlap rather than running one after another"""
+        barrier = threading.Barrier(2, timeout=2)
+
+        with self.app.test_request_context():
+            executor = concurrency.request_executor()
+            results = executor.gather(executor.submit(barrier.wait), executor.submit(barrier.wait))
+
+        self.assertCountEqual([0, 1], results)
+
+    def test_deadline_exceeded_raises(self):
+        """Calls still running when the deadline passes raise an NDOP_RequestError"""
+        self.app.config['FANOUT_TIMEOUT'] = 0.05
+
+        with self.app.test_request_context():
+            executor = concurrency.request_executor()
+            with self.assertRaises(NDOP_RequestError):
+                executor.gather(executor.submit(time.sleep, 0.5))
+
+    def test_executor_is_request_scoped(self):
+        """Each request gets its own executor and deadline"""
+        with self.app.test_request_context():
+            first = concurrency.request_executor()
+            self.assertIs(first, concurrency.request_executor())
+        with self.app.test_request_context():
+            self.assertIsNot(first, concurrency.request_executor())
+
+
+if __name__ == '__main__':
+    unittest.main()
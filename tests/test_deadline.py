@@ -0,0 +1,72 @@
+import time
+import unittest
+
+import requests_mock
+from flask import g
+
+from ndopapp import create_app, constants, deadline
+from ndopapp.client import api_client
+from ndopapp.config import Config
+from ndopapp.deadline import DeadlineExceeded
+from ndopapp.yourdetails.models import check_status_of_pds_search_result
+from tests import common
+
+
+class DeadlineTests(unittest.TestCase):
+    """ Tests for the per request deadline shared by backend calls """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config.update(REQUEST_DEADLINE=20, API_TIMEOUT=10, API_TIMEOUTS={'checksession': 5})
+
+    def tearDown(self):
+        self.app = None
+
+    def test_timeouts_from_endpoint_table(self):
+        """Endpoints use their own timeout, or the default when they have none"""
+        with self.app.test_request_context():
+            self.app.preprocess_request()
+            self.assertEqual(5, deadline.timeout_for('checksession'))
+            self.assertEqual(10, deadline.timeout_for('verifycode'))
+            self.assertEqual(2, deadline.timeout_for('verifycode', 2))
+
+    def test_configured_timeouts_fit_in_the_deadline(self):
+        """No endpoint is configured with a timeout the deadline would always cut short"""
+        for timeout in [Config.API_TIMEOUT, *Config.API_TIMEOUTS.values()]:
+            self.assertLessEqual(timeout, Config.REQUEST_DEADLINE)
+
+    def test_timeouts_never_run_past_the_deadline(self):
+        """Calls late in a request only get the time that is left"""
+        with self.app.test_request_context():
+            self.app.preprocess_request()
+            g.deadline = time.monotonic() + 3
+            self.assertLessEqual(deadline.timeout_for('verifycode'), 3)
+
+    def test_no_deadline_outside_a_request(self):
+        """Without a request the table timeout is used as it is"""
+        with self.app.app_context():
+            self.assertIsNone(deadline.remaining())
+            self.assertEqual(5, deadline.timeout_for('checksession'))
+
+    def test_exhausted_deadline_makes_no_call(self):
+        """Once the deadline has passed backend calls time out without being made"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(requests_mock.ANY, text='{}')
+            self.app.preprocess_request()
+            g.deadline = time.monotonic() - 1
+
+            with self.assertRaises(DeadlineExceeded):
+                api_client.get(self.app.config['CHECK_SESSION_URL'], common.SESSION_ID)
+            self.assertEqual(0, mock.call_count)
+
+    def test_exhausted_deadline_is_a_timeout_outcome(self):
+        """Models treat an exhausted deadline like any other backend timeout"""
+        with requests_mock.Mocker(), self.app.test_request_context():
+            self.app.preprocess_request()
+            g.deadline = time.monotonic() - 1
+
+            self.assertEqual(constants.PDS_REQUEST_TIMEOUT, check_status_of_pds_search_result(common.SESSION_ID))
+
+
+if __name__ == '__main__':
+    unittest.main()
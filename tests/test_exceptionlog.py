@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import patch
+
+from ndopapp import create_app
+from ndopapp.exceptionlog import ExceptionLog, fingerprint
+from ndopapp.utils import log_safe_exception
+
+
+def raise_here(exception):
+    try:
+        raise exception
+    except Exception as e:
+        return e
+
+
+def raise_there(exception):
+    try:
+        raise exception
+    except Exception as e:
+        return e
+
+
+class ExceptionLogTests(unittest.TestCase):
+    """ Tests for logging repeated exceptions once per window """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.exception_log = ExceptionLog()
+        self.exception_log.init_app(self.app)
+
+    def tearDown(self):
+        self.app = None
+
+    def test_fingerprint_by_type_and_location(self):
+        """Exceptions of the same type raised from the same place share a fingerprint"""
+        self.assertEqual(fingerprint(raise_here(ValueError("a"))), fingerprint(raise_here(ValueError("b"))))
+        self.assertNotEqual(fingerprint(raise_here(ValueError())), fingerprint(raise_there(ValueError())))
+        self.assertNotEqual(fingerprint(raise_here(ValueError())), fingerprint(raise_here(KeyError())))
+
+    def test_repeats_counted(self):
+        """Only the first exception of a fingerprint in a window is to be logged"""
+        first = self.exception_log.occurred(raise_here(ValueError()))
+        self.assertIsNotNone(first)
+        self.assertIsNone(self.exception_log.occurred(raise_here(ValueError())))
+        self.assertIsNone(self.exception_log.occurred(raise_here(ValueError())))
+        self.assertIsNotNone(self.exception_log.occurred(raise_there(ValueError())))
+
+    @patch('ndopapp.exceptionlog.logger')
+    @patch('ndopapp.exceptionlog.time.monotonic')
+    def test_repeats_logged_when_window_ends(self, monotonic_mock, logger_mock):
+        """The number of repeats is logged once the window is over, and the next exception logged in full"""
+        monotonic_mock.return_value = 1000
+        key = self.exception_log.occurred(raise_here(ValueError()))
+        self.exception_log.occurred(raise_here(ValueError()))
+        self.exception_log.occurred(raise_here(ValueError()))
+        logger_mock.error.assert_not_called()
+
+        monotonic_mock.return_value = 1000 + self.exception_log.window
+        self.assertEqual(key, self.exception_log.occurred(raise_here(ValueError())))
+        logger_mock.error.assert_called_once_with("exception repeated", {
+            'exception_fingerprint': key,
+            'exception_type': 'ValueError',
+            'repeats': 2,
+            'window': self.exception_log.window,
+        })
+
+    @patch('ndopapp.utils.app')
+    def test_log_safe_exception_logs_first_in_full(self, app_mock):
+        """log_safe_exception logs the traceback summary of the first of each kind of exception only"""
+        with self.app.app_context():
+            for _ in range(3):
+                log_safe_exception(raise_here(ValueError()))
+
+        app_mock.logger.error.assert_called_once()
+        _, exception_info = app_mock.logger.error.call_args[0]
+        self.assertEqual('ValueError', exception_info['exception_type'])
+        self.assertIn('exception_fingerprint', exception_info)
+        self.assertIn('exception_traceback_summary', exception_info)
+
+
+if __name__ == '__main__':
+    unittest.main()
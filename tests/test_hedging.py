@@ -0,0 +1,75 @@
+import threading
+import time
+import unittest
+
+from ndopapp import create_app
+from ndopapp.hedging import Hedger
+
+
+class HedgerTests(unittest.TestCase):
+    """ Tests for hedging slow, idempotent backend calls """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config.update(HEDGE_ENABLED=True, HEDGE_MIN_SAMPLES=5, HEDGE_PERCENTILE=95,
+                               HEDGE_MIN_DELAY=0.01, HEDGE_MAX_RATE=1, HEDGE_BUDGET_CAPACITY=1)
+        self.hedger = Hedger()
+        self.hedger.init_app(self.app)
+        self.addCleanup(self.hedger.pool.shutdown, wait=False)
+
+    def tearDown(self):
+        self.app = None
+
+    def warm_up(self, seconds=0.001):
+        for _ in range(5):
+            self.hedger.latency('patientsearchresult').add(seconds)
+
+    def test_no_hedge_without_latency_history(self):
+        """Calls are made once until there is enough history to pick a hedge delay"""
+        calls = []
+        self.assertEqual('result', self.hedger.call('patientsearchresult', lambda: calls.append(1) or 'result'))
+        self.assertEqual(1, len(calls))
+        self.assertEqual(0, self.hedger.stats()['hedged'])
+
+    def test_slow_first_attempt_hedged(self):
+        """A hedge is sent once the first attempt is slower than usual, and the fastest answer wins"""
+        self.warm_up()
+        attempts = []
+        release = threading.Event()
+
+        def call():
+            attempts.append(1)
+            if len(attempts) == 1:
+                release.wait(2)
+                return 'first'
+            return 'hedge'
+
+        self.assertEqual('hedge', self.hedger.call('patientsearchresult', call))
+        release.set()
+        self.assertEqual({'calls': 1, 'hedged': 1, 'hedge_wins': 1, 'hedges_refused': 0}, self.hedger.stats())
+
+    def test_fast_first_attempt_not_hedged(self):
+        """No hedge is sent when the first attempt answers in time"""
+        self.warm_up(seconds=1)
+        self.assertEqual('first', self.hedger.call('patientsearchresult', lambda: 'first'))
+        self.assertEqual(0, self.hedger.stats()['hedged'])
+
+    def test_hedge_rate_capped(self):
+        """Hedges stop once the hedge budget is spent"""
+        self.warm_up()
+        self.hedger.budget.tokens = 0
+        self.hedger.budget.ratio = 0
+
+        self.assertEqual('slow', self.hedger.call('patientsearchresult', lambda: time.sleep(0.05) or 'slow'))
+        self.assertEqual({'calls': 1, 'hedged': 0, 'hedge_wins': 0, 'hedges_refused': 1}, self.hedger.stats())
+
+    def test_disabled_by_default(self):
+        """Calls are passed straight through when hedging is disabled"""
+        hedger = Hedger()
+        hedger.init_app(create_app('ndopapp.config.TestConfig'))
+        self.assertEqual('result', hedger.call('checksession', lambda: 'result'))
+        self.assertEqual(0, hedger.stats()['calls'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,21 @@
 from unittest import mock
 from io import StringIO
 from contextlib import contextmanager
-from ndopapp.logging import PipeFormatter, record_factory
+from flask import session
+import requests_mock
+
+from ndopapp import create_app, routes
+from ndopapp.config import TestConfig
+from ndopapp.logging import PipeFormatter, record_factory, BoundedQueueHandler, queued, flush_logs, stop_listener, emf
+from tests import common
 
 import unittest
 import logging
 import json
 import os
 import copy
+from http import HTTPStatus
+import queue
 
 
 class PipeFormatterTest(unittest.TestCase):
@@ -127,6 +135,127 @@ class PipeFormatterTest(unittest.TestCase):
         ]])
 
 
+    def test_output_matches_json_dumps(self):
+        """Every value is encoded exactly as json.dumps would encode it"""
+        test_values = ("hello", "caf\u00e9 \"quoted\"\n", "", 0, -12, 2 ** 70, True, False, None, 1.5,
+                       float('nan'), HTTPStatus.OK, {'a': [1, None]}, [], ('t',))
+        logger, stream = self.create_logger(['message', ('levelname', 'level')])
+        for test_value in test_values:
+            logger.info("", {'data': test_value, 1: test_value})
+
+        self.assertEqual(
+            [f'message="" | level="INFO" | data={json.dumps(value)} | 1={json.dumps(value)}' for value in test_values],
+            stream.getvalue().splitlines()
+        )
+
+
+class QueuedLoggingTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.NOTSET)
+        self.stream = StringIO()
+        handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(PipeFormatter(['message']))
+
+        self.logger = logging.Logger("test")
+        self.logger.addHandler(queued(handler, 10))
+
+    def tearDown(self):
+        logging.disable(logging.CRITICAL)
+        stop_listener()
+
+    def test_records_written_by_listener(self):
+        """Queued records are written in full by the time the logs are flushed"""
+        for number in range(5):
+            self.logger.info("queued", {'number': number})
+        flush_logs()
+
+        self.assertEqual(
+            [f'message="queued" | number={number}' for number in range(5)],
+            self.stream.getvalue().splitlines()
+        )
+
+    def test_records_dropped_when_queue_full(self):
+        """Records that don't fit on the queue are counted rather than waited on"""
+        handler = BoundedQueueHandler(queue.Queue(2))
+        logger = logging.Logger("test")
+        logger.addHandler(handler)
+        for _ in range(5):
+            logger.info("message")
+
+        self.assertEqual(2, handler.queue.qsize())
+        self.assertEqual(3, handler.take_dropped())
+        self.assertEqual(0, handler.dropped)
+
+
+def mock_stdout():
+    return mock.patch('sys.stdout', new_callable=StringIO)
+
+
+class EmfConfig(TestConfig):
+    EMF_METRICS = True
+
+
+class EmfTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(EmfConfig)
+        self.client = self.app.test_client()
+        self.client.set_cookie("test", "session_id_nojs", common.SESSION_ID)
+
+    def tearDown(self):
+        emf.init_app(create_app('ndopapp.config.TestConfig'))
+        self.app = None
+
+    def emitted(self, stdout):
+        """The EMF lines written to stdout, checking every metric declared is there"""
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        for line in lines:
+            directive, = line['_aws']['CloudWatchMetrics']
+            self.assertEqual([['Controller']], directive['Dimensions'])
+            for metric in directive['Metrics']:
+                self.assertIn(metric['Name'], line)
+        return lines
+
+    def test_backend_calls_and_render_time(self):
+        """One line per request, with each backend call, the render and the request timed"""
+        with requests_mock.Mocker() as mock, mock_stdout() as stdout:
+            mock.get(self.app.config['CHECK_SESSION_URL'], text='{"valid": true}')
+            self.client.get(routes.get_raw('verification.contact_details_not_found'))
+
+        line, = self.emitted(stdout)
+        units = {metric['Name']: metric['Unit'] for metric in line['_aws']['CloudWatchMetrics'][0]['Metrics']}
+        self.assertEqual('verification.contact_details_not_found', line['Controller'])
+        self.assertEqual(200, line['Status'])
+        for name in ('request', 'api-checksession', 'session-check', 'render'):
+            self.assertEqual('Milliseconds', units[name])
+            self.assertIsInstance(line[name], float)
+
+    def test_cookie_size_and_added_metrics(self):
+        """The session cookie's size and metrics put by the app are included"""
+        @self.app.route('/emf')
+        def emf_view():
+            session['flow'] = 'emf'
+            emf.put("polls", 3)
+            emf.put("polls", 1)
+            return 'ok'
+
+        with mock_stdout() as stdout:
+            self.client.get('/emf')
+
+        line, = self.emitted(stdout)
+        self.assertEqual('emf_view', line['Controller'])
+        self.assertEqual([3, 1], line['polls'])
+        self.assertGreater(line['session-cookie-size'], len('session='))
+
+    def test_off_by_default(self):
+        """Nothing is written unless EMF_METRICS is set"""
+        client = create_app('ndopapp.config.TestConfig').test_client()
+        with mock_stdout() as stdout:
+            client.get(routes.get_raw('main.landing_page'))
+        self.assertEqual('', stdout.getvalue())
+
+
 class RecordFactoryTest(unittest.TestCase):
 
     mock_request = type('obj', (object,), {
@@ -155,6 +284,10 @@ class RecordFactoryTest(unittest.TestCase):
         self.record_factory = logging.getLogRecordFactory()
         logging.setLogRecordFactory(record_factory)
 
+        # record_factory caches the request's fields on g
+        self.mock_g.pop('log_context', None)
+        self.mock_empty_g.pop('log_context', None)
+
     def tearDown(self):
         logging.setLogRecordFactory(self.record_factory)
 
@@ -247,3 +380,26 @@ class RecordFactoryTest(unittest.TestCase):
         self.assertEqual("functionName", record.function_name)
         self.assertEqual("functionVersion", record.function_version)
         self.assertEqual("awsRequestId", record.invocation_id)
+
+    @mock.patch("ndopapp.logging.has_request_context", lambda: True)
+    @mock.patch("ndopapp.logging.request", mock_request)
+    @mock.patch("ndopapp.logging.g", mock_empty_g)
+    def test_request_fields_worked_out_once(self):
+        """Request fields are worked out for the first record of a request and reused for the rest"""
+        logging.makeLogRecord({})
+        with mock.patch.dict(self.mock_request.headers, {'User-Agent': 'anotherUserAgent'}):
+            record = logging.makeLogRecord({})
+        self.assertEqual("userAgent", record.user_agent)
+
+    @mock.patch("ndopapp.logging.has_request_context", lambda: True)
+    @mock.patch("ndopapp.logging.request", mock_request)
+    @mock.patch("ndopapp.logging.g", mock_empty_g)
+    def test_session_id_override_after_first_record(self):
+        """A session id set part way through a request is used for the records after it"""
+        logging.makeLogRecord({})
+        self.mock_empty_g['session_id_override'] = 'sessionID_2'
+        try:
+            record = logging.makeLogRecord({})
+        finally:
+            del self.mock_empty_g['session_id_override']
+        self.assertEqual("sessionID_2", record.session_id)
@@ -0,0 +1,91 @@
+import logging
+import unittest
+
+import requests_mock
+
+from ndopapp import create_app, routes, logsummary
+from ndopapp.config import TestConfig
+from ndopapp.logsummary import SummaryFilter, sampled
+from tests import common
+
+
+class LogSummaryConfig(TestConfig):
+    LOG_SUMMARY = True
+    LOG_DETAIL_SAMPLE_RATE = 0
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LogSummaryTests(unittest.TestCase):
+    """ Tests for summarising each request in one log line """
+
+    def setUp(self):
+        logging.disable(logging.NOTSET)
+        self.app = create_app(LogSummaryConfig)
+        self.client = self.app.test_client()
+        self.client.set_cookie("test", "session_id_nojs", common.SESSION_ID)
+
+        self.handler = RecordingHandler()
+        logsummary.logger.handlers = [self.handler]
+
+    def tearDown(self):
+        logging.disable(logging.CRITICAL)
+        logsummary.init_app(create_app('ndopapp.config.TestConfig'))
+        self.app = None
+
+    def get_page(self):
+        with requests_mock.Mocker() as mock:
+            mock.get(self.app.config['CHECK_SESSION_URL'], text='{"valid": true}')
+            self.client.get(routes.get_raw('verification.contact_details_not_found'))
+
+    def test_one_line_per_request(self):
+        """A request that isn't sampled logs only its summary"""
+        self.get_page()
+
+        self.assertEqual(["request summary"], [record.msg for record in self.handler.records])
+        summary = self.handler.records[0].args
+        self.assertEqual('verification.contact_details_not_found', summary['controller'])
+        self.assertEqual(200, summary['status'])
+        self.assertEqual('ok', summary['outcome'])
+        self.assertEqual(1, summary['calls']['api-checksession']['count'])
+        self.assertEqual(1, summary['calls']['session-check']['count'])
+        self.assertGreater(summary['suppressed'], 0)
+
+    def test_sampled_sessions_logged_in_full(self):
+        """Requests from sampled sessions keep their info lines as well as the summary"""
+        for summary_filter in logsummary.logger.filters:
+            summary_filter.sample_rate = 1
+        self.get_page()
+
+        messages = [record.msg for record in self.handler.records]
+        self.assertIn("starting controller", messages)
+        self.assertEqual(["request summary"], [message for message in messages if message == "request summary"])
+        self.assertEqual("request summary", messages[-1])
+        self.assertEqual(0, self.handler.records[-1].args['suppressed'])
+
+    def test_warnings_always_logged(self):
+        """Warnings and errors get through whichever session logged them"""
+        summary_filter = SummaryFilter(0)
+        with self.app.test_request_context():
+            record = logging.makeLogRecord({'levelno': logging.WARNING, 'session_id': common.SESSION_ID})
+            self.assertTrue(summary_filter.filter(record))
+            record = logging.makeLogRecord({'levelno': logging.INFO, 'session_id': common.SESSION_ID})
+            self.assertFalse(summary_filter.filter(record))
+
+    def test_sampling_deterministic(self):
+        """A session is either always or never sampled"""
+        self.assertEqual(1, len({sampled(common.SESSION_ID, 0.5) for _ in range(10)}))
+        self.assertTrue(300 < sum(sampled(f"session-{number}", 0.5) for number in range(1000)) < 700)
+        self.assertFalse(sampled(None, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import patch
+
+import requests
+import requests_mock
+
+from ndopapp import create_app, routes
+from ndopapp.client import api_client
+from ndopapp.config import TestConfig
+from ndopapp.metrics import Histogram, latency_metrics, outcome_of
+from tests import common
+
+
+class MetricsConfig(TestConfig):
+    METRICS_ENDPOINT = True
+
+
+class HistogramTests(unittest.TestCase):
+    """ Tests for log scale latency histograms """
+
+    def test_percentiles_from_buckets(self):
+        """Percentiles are the upper bound of their bucket, never more than the largest duration"""
+        histogram = Histogram()
+        for milliseconds in [3] * 90 + [150] * 9 + [1200]:
+            histogram.observe(milliseconds)
+
+        summary = histogram.summary()
+        self.assertEqual(100, summary['count'])
+        self.assertEqual(5, summary['p50_ms'])
+        self.assertEqual(200, summary['p95_ms'])
+        self.assertEqual(200, summary['p99_ms'])
+        self.assertEqual(1200, summary['max_ms'])
+
+    def test_outcomes(self):
+        """Calls are labelled by status class, or by the exception they raised"""
+        self.assertEqual('ok', outcome_of(206))
+        self.assertEqual('4xx', outcome_of(401))
+        self.assertEqual('5xx', outcome_of(502))
+        self.assertEqual('timeout', outcome_of(exception=requests.exceptions.ReadTimeout()))
+        self.assertEqual('error', outcome_of(exception=requests.exceptions.ConnectionError()))
+
+
+class MetricsTests(unittest.TestCase):
+    """ Tests for collecting and reporting latency metrics """
+
+    def setUp(self):
+        self.app = create_app(MetricsConfig)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app = None
+
+    def summary(self, kind, endpoint, outcome):
+        for summary in latency_metrics.summaries():
+            if (summary['kind'], summary['endpoint'], summary['outcome']) == (kind, endpoint, outcome):
+                return summary
+        return None
+
+    def test_api_calls_timed_by_endpoint_and_outcome(self):
+        """Each API call is timed under its endpoint and outcome"""
+        with requests_mock.Mocker() as mock:
+            mock.get(self.app.config['PDS_SEARCH_RESULT_URL'], status_code=206)
+            mock.get(self.app.config['CHECK_SESSION_URL'], exc=requests.exceptions.ConnectTimeout)
+
+            api_client.get(self.app.config['PDS_SEARCH_RESULT_URL'], common.SESSION_ID)
+            api_client.get(self.app.config['PDS_SEARCH_RESULT_URL'], common.SESSION_ID)
+            with self.assertRaises(requests.exceptions.ConnectTimeout):
+                api_client.get(self.app.config['CHECK_SESSION_URL'], common.SESSION_ID)
+
+        self.assertEqual(2, self.summary('api', 'patientsearchresult', 'ok')['count'])
+        self.assertEqual(1, self.summary('api', 'checksession', 'timeout')['count'])
+
+    def test_controllers_timed(self):
+        """Each page served is timed under its controller"""
+        self.client.get(routes.get_raw('main.landing_page'))
+        self.assertEqual(1, self.summary('controller', 'main.landing_page', 'ok')['count'])
+
+    def test_metrics_endpoint(self):
+        """The summaries are served from /__metrics"""
+        self.client.get(routes.get_raw('main.landing_page'))
+        response = self.client.get('/__metrics')
+        self.assertIn({'kind': 'controller', 'endpoint': 'main.landing_page', 'outcome': 'ok'},
+                      [{key: summary[key] for key in ('kind', 'endpoint', 'outcome')} for summary in response.get_json()['latency']])
+
+    def test_metrics_endpoint_includes_stats(self):
+        """The backend call counters are served from /__metrics with the summaries"""
+        stats = self.client.get('/__metrics').get_json()['stats']
+        self.assertEqual(['hedging', 'retry_budget', 'session_cache', 'single_flight'], sorted(stats))
+        self.assertEqual({'size', 'hits', 'misses'}, set(stats['session_cache']))
+        self.assertEqual({'in_flight', 'made', 'shared'}, set(stats['single_flight']))
+
+    def test_metrics_endpoint_off_by_default(self):
+        """/__metrics is only served when METRICS_ENDPOINT is set"""
+        client = create_app('ndopapp.config.TestConfig').test_client()
+        self.assertEqual(404, client.get('/__metrics').status_code)
+
+    @patch('ndopapp.metrics.logger')
+    def test_summaries_logged_periodically(self, logger_mock):
+        """Summaries are logged by the first request after the log interval"""
+        latency_metrics.log_interval = 0
+        self.client.get(routes.get_raw('main.landing_page'))
+        logger_mock.info.assert_any_call("latency summary", self.summary('controller', 'main.landing_page', 'ok'))
+        logger_mock.info.assert_called_with("backend stats", latency_metrics.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
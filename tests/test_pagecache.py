@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch
+
+from flask import flash, render_template
+
+from ndopapp import create_app, constants
+from ndopapp.pagecache import page_cache
+
+
+class PageCacheTests(unittest.TestCase):
+    """ Tests for pre-rendered pages """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+
+    def tearDown(self):
+        self.app = None
+
+    def render_waiting_page(self, refresh_interval=2):
+        return page_cache.render('waiting-for-results.html',
+                                 waiting_message=constants.PDS_SEARCH_WAITING_MESSAGE,
+                                 refresh_interval=refresh_interval)
+
+    def test_page_rendered_once_per_context(self):
+        """The same context is served from cache, a new one is rendered"""
+        with self.app.test_request_context(), \
+                patch('ndopapp.pagecache.render_template', wraps=render_template) as render_mock:
+            first = self.render_waiting_page()
+            second = self.render_waiting_page()
+            self.render_waiting_page(refresh_interval=4)
+
+        self.assertEqual(2, render_mock.call_count)
+        self.assertEqual(first.get_data(), second.get_data())
+        self.assertIn(constants.PDS_SEARCH_WAITING_MESSAGE.encode(), first.get_data())
+        self.assertIn(b'content="2"', first.get_data())
+        self.assertEqual('text/html; charset=utf-8', first.headers['Content-Type'])
+        self.assertEqual(str(len(first.get_data())), first.headers['Content-Length'])
+
+    def test_cached_page_logged(self):
+        """Serving a cached page logs it as rendering the page, as the template_rendered signal would"""
+        with self.app.test_request_context():
+            self.render_waiting_page()
+            with patch.object(self.app.logger, 'info') as info_mock:
+                self.render_waiting_page()
+
+        info_mock.assert_called_once_with('rendering page', {
+            'page': 'main.index',
+            'template': 'waiting-for-results.html',
+            'cached': True,
+        })
+
+    def test_flashed_messages_rendered_normally(self):
+        """Pages are rendered without caching while there are flashed messages"""
+        with self.app.test_request_context():
+            flash({'radio': [{'message': 'Choose an option', 'href': 'radio', 'id': 'radioError'}]})
+            response = self.render_waiting_page()
+
+        self.assertIn('Choose an option', response.get_data(as_text=True))
+        self.assertEqual(0, len(page_cache))
+
+    def test_cleared_for_each_app(self):
+        """Pages cached for one app's config are not served to another"""
+        with self.app.test_request_context():
+            self.render_waiting_page()
+
+        create_app('ndopapp.config.TestConfig')
+
+        self.assertEqual(0, len(page_cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
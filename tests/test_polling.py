@@ -0,0 +1,132 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from ndopapp import create_app, polling
+from ndopapp.stats import RollingWindow
+
+
+class LongPollTests(unittest.TestCase):
+    """ Tests for waiting on backend results in process """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config['LONG_POLL_TIMEOUT'] = 1
+        self.app.config['LONG_POLL_INTERVAL'] = 0.01
+
+    def tearDown(self):
+        self.app = None
+
+    def test_polls_until_complete(self):
+        """The backend is polled again until a complete result is returned"""
+        poll = MagicMock(side_effect=['incomplete', 'incomplete', 'success'])
+
+        with self.app.app_context():
+            result = polling.long_poll(poll, 'session id', is_complete=lambda result: result == 'success')
+
+        self.assertEqual('success', result)
+        self.assertEqual(3, poll.call_count)
+        poll.assert_called_with('session id')
+
+    def test_existing_result_used_first(self):
+        """A result the caller already has is not polled for again"""
+        poll = MagicMock()
+
+        with self.app.app_context():
+            result = polling.long_poll(poll, 'session id', is_complete=lambda result: True, result='success')
+
+        self.assertEqual('success', result)
+        poll.assert_not_called()
+
+    def test_gives_up_after_timeout(self):
+        """The last incomplete result is returned once the timeout has passed"""
+        self.app.config['LONG_POLL_TIMEOUT'] = 0.1
+        poll = MagicMock(return_value='incomplete')
+
+        with self.app.app_context():
+            started = time.monotonic()
+            result = polling.long_poll(poll, 'session id', is_complete=lambda result: False)
+
+        self.assertEqual('incomplete', result)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertGreater(poll.call_count, 1)
+
+    @patch('ndopapp.polling.time.sleep')
+    def test_interval_backs_off(self, sleep_mock):
+        """The wait between polls doubles up to LONG_POLL_MAX_INTERVAL"""
+        self.app.config.update(LONG_POLL_TIMEOUT=60, LONG_POLL_INTERVAL=0.5, LONG_POLL_MAX_INTERVAL=3)
+        poll = MagicMock(side_effect=['incomplete'] * 5 + ['success'])
+
+        with self.app.app_context():
+            polling.long_poll(poll, 'session id', is_complete=lambda result: result == 'success')
+
+        self.assertEqual([0.5, 1, 2, 3, 3], [args[0] for args, _ in sleep_mock.call_args_list])
+
+    def test_disabled_with_zero_timeout(self):
+        """Only a single poll is made when long polling is disabled"""
+        self.app.config['LONG_POLL_TIMEOUT'] = 0
+        poll = MagicMock(return_value='incomplete')
+
+        with self.app.app_context():
+            polling.long_poll(poll, 'session id', is_complete=lambda result: False)
+
+        poll.assert_called_once()
+
+    def test_never_waits_past_journey_timeout(self):
+        """The wait stops at the journey's timeout threshold"""
+        poll = MagicMock(return_value='incomplete')
+
+        with self.app.app_context():
+            polling.long_poll(poll, 'session id', is_complete=lambda result: False, until=int(time.time()) - 1)
+
+        poll.assert_called_once()
+
+
+class RefreshIntervalTests(unittest.TestCase):
+    """ Tests for the waiting page's refresh interval """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config.update(REFRESH_MIN_INTERVAL=1, REFRESH_MAX_INTERVAL=10, REFRESH_BACKOFF=2)
+        self.completion_times = {'pds_search': RollingWindow(), 'store_preference': RollingWindow()}
+        patcher = patch('ndopapp.polling.completion_times', self.completion_times)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def intervals(self, session, count):
+        with self.app.app_context():
+            return [polling.next_refresh_interval(session, 'pds_search') for _ in range(count)]
+
+    def test_starts_short_and_backs_off(self):
+        """Without completion times the interval starts at the minimum and backs off to the maximum"""
+        session = {}
+        polling.track(session, 'pds_search')
+        self.assertEqual([1, 2, 4, 8, 10, 10], self.intervals(session, 6))
+
+    def test_first_refresh_seeded_from_completion_times(self):
+        """The first refresh waits for when journeys usually complete"""
+        for seconds in (3.2, 4, 5, 30):
+            self.completion_times['pds_search'].add(seconds)
+        session = {'polls': {'pds_search': (time.time() - 3, 0)}}
+        self.assertEqual([2, 2, 4], self.intervals(session, 3))
+
+    def test_fixed_interval_when_not_adaptive(self):
+        """META_REFRESH_INTERVAL is used when adaptive refresh is disabled"""
+        self.app.config.update(ADAPTIVE_REFRESH=False, META_REFRESH_INTERVAL=5)
+        self.assertEqual([5, 5], self.intervals({}, 2))
+
+    def test_completed_polls_recorded(self):
+        """Completed polls add their duration to the completion times, timed out polls do not"""
+        session = {}
+        polling.track(session, 'pds_search')
+        polling.finish(session, 'pds_search')
+        polling.track(session, 'store_preference')
+        polling.finish(session, 'store_preference', completed=False)
+
+        self.assertEqual({}, session['polls'])
+        self.assertEqual(1, len(self.completion_times['pds_search']))
+        self.assertEqual(0, len(self.completion_times['store_preference']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import time
+import unittest
+from http import HTTPStatus
+from unittest.mock import patch
+
+import requests
+import requests_mock
+from flask import g
+
+from ndopapp import create_app
+from ndopapp.client import api_client
+from ndopapp.retry import RetryBudget, retry_budget
+from tests import common
+
+
+class RetryBudgetTests(unittest.TestCase):
+    """ Tests for the process wide retry budget """
+
+    def test_retries_limited_to_share_of_calls(self):
+        """Once the initial tokens are spent, each retry needs 1 / ratio calls"""
+        budget = RetryBudget(ratio=0.5, capacity=1)
+
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.assertEqual({'tokens': 0, 'retried': 2, 'refused': 2}, budget.stats())
+
+    def test_tokens_capped(self):
+        """Tokens never build up past the capacity"""
+        budget = RetryBudget(ratio=1, capacity=2)
+        for _ in range(5):
+            budget.deposit()
+        self.assertEqual(2, budget.tokens)
+
+
+class RetryTests(unittest.TestCase):
+    """ Tests for retrying idempotent backend calls """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config.update(RETRY_BASE_DELAY=0.001, RETRY_MAX_DELAY=0.001, RETRY_MAX_ATTEMPTS=3)
+        self.url = self.app.config['PREFERENCE_RESULT_URL']
+
+    def tearDown(self):
+        self.app = None
+
+    def get(self, retry=True):
+        return api_client.get(self.url, common.SESSION_ID, retry=retry)
+
+    def test_connection_errors_retried(self):
+        """A connection reset is retried and the next response returned"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(self.url, [{'exc': requests.exceptions.ConnectionError}, {'text': '{}'}])
+
+            self.assertEqual(HTTPStatus.OK.value, self.get().status_code)
+            self.assertEqual(2, mock.call_count)
+
+    def test_gateway_errors_retried_up_to_max_attempts(self):
+        """Gateway errors are retried until attempts run out, then returned"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(self.url, status_code=HTTPStatus.SERVICE_UNAVAILABLE.value)
+
+            self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE.value, self.get().status_code)
+            self.assertEqual(3, mock.call_count)
+
+    def test_other_errors_not_retried(self):
+        """Errors from the backend itself are returned straight away"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(self.url, status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value)
+
+            self.get()
+            self.assertEqual(1, mock.call_count)
+
+    def test_calls_not_retried_unless_asked(self):
+        """Only calls made with retry are retried"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(self.url, exc=requests.exceptions.ConnectionError)
+
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.get(retry=False)
+            self.assertEqual(1, mock.call_count)
+
+    def test_retries_stop_when_budget_spent(self):
+        """No retry is made once the retry budget is spent"""
+        retry_budget.tokens = 0
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(self.url, exc=requests.exceptions.ConnectionError)
+
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.get()
+            self.assertEqual(1, mock.call_count)
+        self.assertEqual(1, retry_budget.stats()['refused'])
+
+    @patch('ndopapp.retry.backoff', return_value=1)
+    def test_retries_stop_at_deadline(self, _):
+        """No retry is made that would run past the request deadline"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.get(self.url, exc=requests.exceptions.ConnectionError)
+            g.deadline = time.monotonic() + 0.5
+
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.get()
+            self.assertEqual(1, mock.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
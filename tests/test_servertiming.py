@@ -0,0 +1,47 @@
+import unittest
+
+import requests_mock
+
+from ndopapp import create_app, routes, servertiming
+from ndopapp.config import TestConfig
+from tests import common
+
+
+class ServerTimingConfig(TestConfig):
+    SERVER_TIMING = True
+
+
+class ServerTimingTests(unittest.TestCase):
+    """ Tests for the Server-Timing response header """
+
+    def setUp(self):
+        self.app = create_app(ServerTimingConfig)
+        self.client = self.app.test_client()
+        self.client.set_cookie("test", "session_id_nojs", common.SESSION_ID)
+
+    def tearDown(self):
+        self.app = None
+
+    def test_header_breaks_down_response(self):
+        """The header times the session check, each API call, rendering and the session cookie"""
+        with requests_mock.Mocker() as mock:
+            mock.get(self.app.config['CHECK_SESSION_URL'], text='{"valid": true}')
+            response = self.client.get(routes.get_raw('verification.contact_details_not_found'))
+
+        names = [metric.split(';')[0] for metric in response.headers['Server-Timing'].split(', ')]
+        self.assertEqual(['total', 'api-checksession', 'session-check', 'render', 'session-cookie'], names)
+
+    def test_off_by_default(self):
+        """No header is added unless SERVER_TIMING is set"""
+        client = create_app('ndopapp.config.TestConfig').test_client()
+        response = client.get(routes.get_raw('main.landing_page'))
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_repeated_names_added_up(self):
+        """Durations of the same name are added up, with the number of calls as the description"""
+        value = servertiming.header_value([("render", None, 0.002), ("api-details", None, 0.1), ("render", None, 0.003)])
+        self.assertEqual('render;dur=5.0;desc="2 calls", api-details;dur=100.0', value)
+
+
+if __name__ == '__main__':
+    unittest.main()
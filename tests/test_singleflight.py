@@ -0,0 +1,79 @@
+import threading
+import time
+import unittest
+
+from ndopapp.singleflight import SingleFlight
+
+
+class SingleFlightTests(unittest.TestCase):
+    """ Tests for sharing in flight calls between concurrent callers """
+
+    def setUp(self):
+        self.in_flight = SingleFlight()
+        self.release = threading.Event()
+
+    def call_concurrently(self, key, func, callers=2):
+        results = []
+
+        def caller():
+            try:
+                results.append(self.in_flight.do(key, func))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=caller) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        self.wait_for_shared(callers - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join(2)
+        return results
+
+    def wait_for_shared(self, shared):
+        give_up_at = time.monotonic() + 2
+        while self.in_flight.stats()['shared'] < shared and time.monotonic() < give_up_at:
+            time.sleep(0.001)
+
+    def test_concurrent_callers_share_one_call(self):
+        """Callers arriving while a call is in flight get its result without calling again"""
+        calls = []
+
+        def func():
+            calls.append(1)
+            self.release.wait(2)
+            return 'result'
+
+        results = self.call_concurrently('key', func, callers=3)
+
+        self.assertEqual(['result'] * 3, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual({'in_flight': 0, 'made': 1, 'shared': 2}, self.in_flight.stats())
+
+    def test_exceptions_shared(self):
+        """Every waiting caller sees the exception raised by the call"""
+        def func():
+            self.release.wait(2)
+            raise ValueError('failed')
+
+        results = self.call_concurrently('key', func)
+
+        self.assertEqual(2, len(results))
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(0, self.in_flight.stats()['in_flight'])
+
+    def test_completed_calls_not_reused(self):
+        """A caller after a call has completed makes a new call"""
+        self.assertEqual(1, self.in_flight.do('key', lambda: 1))
+        self.assertEqual(2, self.in_flight.do('key', lambda: 2))
+        self.assertEqual({'in_flight': 0, 'made': 2, 'shared': 0}, self.in_flight.stats())
+
+    def test_different_keys_not_shared(self):
+        """Calls for different keys are made separately"""
+        self.assertEqual('a', self.in_flight.do(('checksession', 'a'), lambda: 'a'))
+        self.assertEqual('b', self.in_flight.do(('checksession', 'b'), lambda: 'b'))
+        self.assertEqual(0, self.in_flight.stats()['shared'])
+
+
+if __name__ == '__main__':
+    unittest.main()
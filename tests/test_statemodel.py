@@ -0,0 +1,194 @@
+import json
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+import requests_mock
+
+from ndopapp import create_app
+from botocore.exceptions import ClientError, ReadTimeoutError
+from flask import g
+
+from ndopapp.deadline import DeadlineExceeded
+from ndopapp.metrics import latency_metrics
+from ndopapp.statemodel import StateModelInvoker, LambdaTransport, HttpTransport, KEPT_FIELDS
+from tests import common
+
+
+class StateModelInvokerTests(unittest.TestCase):
+    """ Tests for reading and writing the state model """
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config.update(AWS_DEFAULT_REGION='eu-west-2', AWS_ACCOUNT_ID='999999999999',
+                               AWS_ENV_NAME='ndop-build10', LAMBDA_MAX_POOL_CONNECTIONS=25)
+        self.invoker = StateModelInvoker()
+
+    def tearDown(self):
+        self.app = None
+
+    @patch('ndopapp.statemodel.boto3')
+    def test_lambda_client_built_once(self, boto_mock):
+        """One boto3 client, configured from the app config, is used for every invocation"""
+        client_mock = boto_mock.session.Session.return_value.client.return_value
+        payload_mock = MagicMock()
+        payload_mock.read.return_value = '{"session_id": "1"}'
+        client_mock.invoke.return_value = {'StatusCode': 200, 'Payload': payload_mock}
+
+        self.invoker.init_app(self.app)
+        with self.app.app_context():
+            self.assertEqual({'session_id': '1'}, self.invoker.get('1'))
+            self.invoker.put('{}')
+
+        boto_mock.session.Session.return_value.client.assert_called_once()
+        _, kwargs = boto_mock.session.Session.return_value.client.call_args
+        self.assertEqual(25, kwargs['config'].max_pool_connections)
+        self.assertEqual('eu-west-2', kwargs['region_name'])
+        client_mock.invoke.assert_called_with(
+            FunctionName='arn:aws:lambda:eu-west-2:999999999999:function:ndop-build10-put-state-model',
+            Payload='{}'
+        )
+
+    @patch('ndopapp.statemodel.boto3')
+    def test_lambda_invocations_bounded_by_deadline(self, boto_mock):
+        """An invocation with less time left than the client's timeouts and retries could take fits in what is left"""
+        client_mock = boto_mock.session.Session.return_value.client.return_value
+        client_mock.invoke.return_value = {'StatusCode': 200, 'Payload': MagicMock(**{'read.return_value': '{}'})}
+        self.app.config.update(REQUEST_DEADLINE=60, API_TIMEOUTS={'get-state-model': 30})
+
+        self.invoker.init_app(self.app)
+        with self.app.test_request_context():
+            self.app.preprocess_request()
+            self.invoker.get(common.SESSION_ID)
+            g.deadline = time.monotonic() + 3.5
+            self.invoker.get(common.SESSION_ID)
+
+        configs = [kwargs['config'] for _, kwargs in boto_mock.session.Session.return_value.client.call_args_list]
+        self.assertEqual([(2, 5, 2), (1.5, 1.5, 0)],
+                         [(config.connect_timeout, config.read_timeout, config.retries['max_attempts']) for config in configs])
+
+    @patch('ndopapp.statemodel.boto3')
+    def test_lambda_timeout_is_a_timeout_outcome(self, boto_mock):
+        """A lambda invocation timing out is handled and counted like a backend call timing out"""
+        client_mock = boto_mock.session.Session.return_value.client.return_value
+        client_mock.invoke.side_effect = ReadTimeoutError(endpoint_url='https://lambda')
+        latency_metrics.clear()
+
+        self.invoker.init_app(self.app)
+        with self.app.test_request_context():
+            self.app.preprocess_request()
+            with self.assertRaises(DeadlineExceeded):
+                self.invoker.get(common.SESSION_ID)
+
+        self.assertEqual([('lambda', 'get-state-model', 'timeout')],
+                         [(s['kind'], s['endpoint'], s['outcome']) for s in latency_metrics.summaries() if s['kind'] == 'lambda'])
+
+    def test_arns_memoised(self):
+        """Function ARNs are only formatted the first time they are needed"""
+        transport = LambdaTransport(self.app.config)
+        with patch('ndopapp.statemodel.function_arn', return_value='arn') as function_arn_mock:
+            transport.arn('get-state-model')
+            transport.arn('get-state-model')
+        function_arn_mock.assert_called_once()
+
+    def test_http_transport_calls_mock_endpoints(self):
+        """The http transport reads and writes through the mock's state model endpoints"""
+        self.app.config['STATE_MODEL_TRANSPORT'] = 'http'
+        self.invoker.init_app(self.app)
+        self.assertIsInstance(self.invoker.transport, HttpTransport)
+
+        with requests_mock.Mocker() as mock, self.app.app_context():
+            mock.get(self.app.config['GET_STATE_MODEL_FUNCTION_NAME'], text='{"state_model": {"flow": "nhs_number"}}')
+            mock.post(self.app.config['PUT_STATE_MODEL_FUNCTION_NAME'], text='')
+
+            self.assertEqual({'state_model': {'flow': 'nhs_number'}}, self.invoker.get(common.SESSION_ID))
+            self.assertEqual({'session_id': common.SESSION_ID}, json.loads(mock.last_request.text))
+            self.assertEqual(f'session_id={common.SESSION_ID}', mock.last_request.headers['Cookie'])
+
+            self.assertEqual({}, self.invoker.put(json.dumps({'session_id': common.SESSION_ID})))
+            self.assertEqual('POST', mock.last_request.method)
+
+    def test_reset_off_by_default(self):
+        """The reset is not tried unless STATE_MODEL_RESET is set"""
+        self.app.config['STATE_MODEL_TRANSPORT'] = 'http'
+        self.invoker.init_app(self.app)
+
+        with requests_mock.Mocker() as mock, self.app.app_context():
+            self.assertFalse(self.invoker.reset(common.SESSION_ID))
+            self.assertEqual(0, mock.call_count)
+
+    def test_reset_in_one_call(self):
+        """The state model is reset with just the session id and the fields to keep"""
+        self.app.config.update(STATE_MODEL_TRANSPORT='http', STATE_MODEL_RESET=True)
+        self.invoker.init_app(self.app)
+
+        with requests_mock.Mocker() as mock, self.app.app_context():
+            mock.post(self.app.config['RESET_STATE_MODEL_FUNCTION_NAME'], text='{}')
+
+            self.assertTrue(self.invoker.reset(common.SESSION_ID))
+            self.assertEqual({'session_id': common.SESSION_ID, 'keep': list(KEPT_FIELDS)},
+                             json.loads(mock.last_request.text))
+
+    def test_reset_not_supported_remembered(self):
+        """Once the backend is found to have no reset it is not asked again"""
+        self.app.config.update(STATE_MODEL_TRANSPORT='http', STATE_MODEL_RESET=True)
+        self.invoker.init_app(self.app)
+
+        with requests_mock.Mocker() as mock, self.app.app_context():
+            mock.post(self.app.config['RESET_STATE_MODEL_FUNCTION_NAME'], status_code=404)
+
+            self.assertFalse(self.invoker.reset(common.SESSION_ID))
+            self.assertFalse(self.invoker.reset(common.SESSION_ID))
+            self.assertEqual(1, mock.call_count)
+
+    def test_reset_http_failure_falls_back(self):
+        """A reset the mock can't be reached for falls back to reading and writing the state model"""
+        self.app.config.update(STATE_MODEL_TRANSPORT='http', STATE_MODEL_RESET=True)
+        self.invoker.init_app(self.app)
+
+        with requests_mock.Mocker() as mock, self.app.app_context():
+            mock.post(self.app.config['RESET_STATE_MODEL_FUNCTION_NAME'], exc=requests.exceptions.ConnectionError)
+
+            self.assertFalse(self.invoker.reset(common.SESSION_ID))
+        self.assertTrue(self.invoker.reset_supported)
+
+    @patch('ndopapp.statemodel.boto3')
+    def test_reset_lambda_not_deployed(self, boto_mock):
+        """A missing reset lambda falls back to reading and writing the state model"""
+        client_mock = boto_mock.session.Session.return_value.client.return_value
+        client_mock.invoke.side_effect = ClientError({'Error': {'Code': 'ResourceNotFoundException'}}, 'Invoke')
+
+        self.app.config['STATE_MODEL_RESET'] = True
+        self.invoker.init_app(self.app)
+        with self.app.app_context():
+            self.assertFalse(self.invoker.reset(common.SESSION_ID))
+        self.assertFalse(self.invoker.reset_supported)
+
+    @patch('ndopapp.statemodel.boto3')
+    def test_reset_lambda_refused(self, boto_mock):
+        """Any other lambda error falls back to reading and writing the state model for this call"""
+        client_mock = boto_mock.session.Session.return_value.client.return_value
+        client_mock.invoke.side_effect = ClientError({'Error': {'Code': 'AccessDeniedException'}}, 'Invoke')
+
+        self.app.config['STATE_MODEL_RESET'] = True
+        self.invoker.init_app(self.app)
+        with self.app.app_context():
+            self.assertFalse(self.invoker.reset(common.SESSION_ID))
+        self.assertTrue(self.invoker.reset_supported)
+
+    @patch('ndopapp.statemodel.boto3')
+    def test_reset_lambda_failed(self, boto_mock):
+        """A reset answered with anything but a 200 falls back to reading and writing the state model"""
+        client_mock = boto_mock.session.Session.return_value.client.return_value
+        client_mock.invoke.return_value = {'StatusCode': 500, 'Payload': MagicMock()}
+
+        self.app.config['STATE_MODEL_RESET'] = True
+        self.invoker.init_app(self.app)
+        with self.app.app_context(), patch('ndopapp.statemodel.app') as app_mock:
+            self.assertFalse(self.invoker.reset(common.SESSION_ID))
+        app_mock.logger.error.assert_called_once_with("error while resetting state model")
+
+
+if __name__ == '__main__':
+    unittest.main()
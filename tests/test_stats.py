@@ -0,0 +1,33 @@
+import unittest
+
+from ndopapp.stats import RollingWindow
+
+
+class RollingWindowTests(unittest.TestCase):
+
+    def test_percentiles(self):
+        """Percentiles are taken from the observed values"""
+        window = RollingWindow()
+        for value in range(1, 101):
+            window.add(value)
+
+        self.assertEqual(51, window.percentile(50))
+        self.assertEqual(100, window.percentile(99))
+        self.assertEqual(100, window.percentile(100))
+
+    def test_only_recent_values_kept(self):
+        """Old observations drop out of the window"""
+        window = RollingWindow(size=2)
+        for value in (100, 1, 2):
+            window.add(value)
+
+        self.assertEqual(2, len(window))
+        self.assertEqual(2, window.percentile(100))
+
+    def test_empty_window(self):
+        """An empty window has no percentiles"""
+        self.assertIsNone(RollingWindow().percentile(50))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import base64
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests_mock
+
+from ndopapp import create_app, routes, tracing
+from ndopapp.config import TestConfig
+from ndopapp.statemodel import LambdaTransport
+from tests import common
+
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class TracingConfig(TestConfig):
+    TRACING = True
+
+
+class TracingTests(unittest.TestCase):
+    """ Tests for tracing controllers and their backend calls """
+
+    def setUp(self):
+        self.app = create_app(TracingConfig)
+        self.client = self.app.test_client()
+        self.client.set_cookie("test", "session_id_nojs", common.SESSION_ID)
+
+    def tearDown(self):
+        self.app = None
+
+    @staticmethod
+    def spans(logger_mock):
+        return {fields['span_kind']: fields for message, fields in
+                (call[0] for call in logger_mock.info.call_args_list) if message == "span"}
+
+    @patch('ndopapp.tracing.logger')
+    def test_backend_calls_traced(self, logger_mock):
+        """API calls get a span under the controller's, and pass the trace on in a traceparent header"""
+        with requests_mock.Mocker() as mock:
+            mock.get(self.app.config['CHECK_SESSION_URL'], text='{"valid": true}')
+            self.client.get(routes.get_raw('verification.contact_details_not_found'))
+            traceparent = mock.last_request.headers['traceparent']
+
+        spans = self.spans(logger_mock)
+        controller, api = spans['controller'], spans['api']
+        self.assertEqual('verification.contact_details_not_found', controller['span_name'])
+        self.assertEqual(200, controller['status'])
+        self.assertEqual('checksession', api['span_name'])
+        self.assertEqual('ok', api['outcome'])
+        self.assertEqual(controller['span_id'], api['parent_span_id'])
+        self.assertEqual(controller['trace_id'], api['trace_id'])
+        self.assertEqual(f"00-{api['trace_id']}-{api['span_id']}-01", traceparent)
+
+    @patch('ndopapp.tracing.logger')
+    def test_incoming_trace_continued(self, logger_mock):
+        """A request with a traceparent header continues that trace"""
+        self.client.get(routes.get_raw('main.landing_page'),
+                        headers={'traceparent': f"00-{TRACE_ID}-{PARENT_ID}-01"})
+
+        controller = self.spans(logger_mock)['controller']
+        self.assertEqual(TRACE_ID, controller['trace_id'])
+        self.assertEqual(PARENT_ID, controller['parent_span_id'])
+
+    @patch('ndopapp.tracing.logger')
+    @patch('ndopapp.statemodel.boto3')
+    def test_lambda_invocations_traced(self, boto_mock, logger_mock):
+        """Lambda invocations get a span, and pass the trace on in the client context"""
+        client_mock = boto_mock.session.Session.return_value.client.return_value
+        client_mock.invoke.return_value = {'StatusCode': 200, 'Payload': MagicMock(**{'read.return_value': '{}'})}
+
+        with self.app.test_request_context():
+            tracing.start_request()
+            LambdaTransport(self.app.config).invoke('put-state-model', '{}')
+
+        span = self.spans(logger_mock)['lambda']
+        _, kwargs = client_mock.invoke.call_args
+        client_context = json.loads(base64.b64decode(kwargs['ClientContext']))
+        self.assertEqual('put-state-model', span['span_name'])
+        self.assertEqual(f"00-{span['trace_id']}-{span['span_id']}-01", client_context['custom']['traceparent'])
+
+    @patch('ndopapp.tracing.logger')
+    def test_off_by_default(self, logger_mock):
+        """Nothing is traced unless TRACING is set"""
+        client = create_app('ndopapp.config.TestConfig').test_client()
+        client.get(routes.get_raw('main.landing_page'))
+        self.assertEqual({}, self.spans(logger_mock))
+
+
+if __name__ == '__main__':
+    unittest.main()
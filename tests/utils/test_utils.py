@@ -25,16 +25,55 @@ class TestUtils(unittest.TestCase):
         assert messagesDict == {0: ['HTTPError'], 1: ['jim'], 2: ['jam']}
 
     @patch('ndopapp.utils.app')
-    @patch('ndopapp.utils.requests')
-    def test_is_session_valid_when_session_is_valid(self, requests_mock, _):
+    @patch('ndopapp.utils.api_client')
+    def test_is_session_valid_when_session_is_valid(self, api_client_mock, _):
         chech_session_response = json.dumps({'valid': True})
 
-        response_object_mock = MagicMock()
+        response_object_mock = MagicMock(status_code=200)
         response_object_mock.text = chech_session_response
-        requests_mock.get.return_value = response_object_mock
+        api_client_mock.get.return_value = response_object_mock
 
         self.assertTrue(utils.is_session_valid('some session id'))
 
+    @patch('ndopapp.utils.app')
+    @patch('ndopapp.utils.api_client')
+    def test_is_session_valid_caches_invalid_sessions(self, api_client_mock, _):
+        response_object_mock = MagicMock(status_code=200)
+        response_object_mock.text = json.dumps({'valid': False})
+        api_client_mock.get.return_value = response_object_mock
+
+        self.assertFalse(utils.is_session_valid('dead session id'))
+        self.assertFalse(utils.is_session_valid('dead session id'))
+
+        api_client_mock.get.assert_called_once()
+
+    @patch('ndopapp.utils.app')
+    @patch('ndopapp.utils.api_client')
+    def test_is_session_valid_does_not_cache_gateway_errors(self, api_client_mock, _):
+        failed = MagicMock(status_code=502, text=json.dumps({'message': 'Internal server error'}))
+        recovered = MagicMock(status_code=200, text=json.dumps({'valid': True}))
+        api_client_mock.get.side_effect = [failed, recovered]
+
+        self.assertFalse(utils.is_session_valid('blipped session id'))
+        self.assertTrue(utils.is_session_valid('blipped session id'))
+
+        self.assertEqual(2, api_client_mock.get.call_count)
+
+    @patch('ndopapp.utils.api_client')
+    def test_landing_page_invalidates_cached_session(self, api_client_mock):
+        response_object_mock = MagicMock(status_code=200)
+        response_object_mock.text = json.dumps({'valid': True})
+        api_client_mock.get.return_value = response_object_mock
+
+        with self.app.app_context():
+            utils.is_session_valid(common.SESSION_ID)
+        self.client.set_cookie("test", 'session_id_nojs', common.SESSION_ID)
+        self.client.get(routes.get_raw('main.landing_page'))
+        with self.app.app_context():
+            utils.is_session_valid(common.SESSION_ID)
+
+        self.assertEqual(2, api_client_mock.get.call_count)
+
     @patch('ndopapp.utils.request')
     @patch('ndopapp.utils.is_session_valid', return_value=False)
     @patch('ndopapp.utils.render_template')
@@ -45,6 +84,57 @@ class TestUtils(unittest.TestCase):
 
         render_mock.assert_called_once()
 
+    @patch('ndopapp.utils.is_session_valid')
+    def test_check_session_optimistically_skips_session_check(self, is_session_valid_mock):
+        self.app.config['OPTIMISTIC_SESSION_CHECK'] = True
+        controller = MagicMock(return_value='controller response')
+
+        with self.app.test_request_context(headers={'Cookie': f'session_id_nojs={common.SESSION_ID}'}):
+            response = utils.check_session_optimistically(controller)()
+
+        self.assertEqual('controller response', response)
+        controller.assert_called_with(common.SESSION_ID)
+        is_session_valid_mock.assert_not_called()
+
+    @patch('ndopapp.utils.render_template', return_value='session expired')
+    def test_check_session_optimistically_renders_session_expired_when_rejected(self, render_mock):
+        self.app.config['OPTIMISTIC_SESSION_CHECK'] = True
+        controller = MagicMock(side_effect=utils.NDOP_SessionExpiredError('rejected'))
+
+        with self.app.test_request_context(headers={'Cookie': f'session_id_nojs={common.SESSION_ID}'}):
+            response = utils.check_session_optimistically(controller)()
+            self.assertFalse(utils.is_session_valid(common.SESSION_ID))
+
+        self.assertEqual('session expired', response)
+        render_mock.assert_called_with('session-expired.html', routes=routes)
+
+    @patch('ndopapp.utils.is_session_valid', return_value=False)
+    @patch('ndopapp.utils.render_template', return_value='session expired')
+    def test_check_session_optimistically_checks_session_when_disabled(self, render_mock, is_session_valid_mock):
+        controller = MagicMock()
+
+        with self.app.test_request_context(headers={'Cookie': f'session_id_nojs={common.SESSION_ID}'}):
+            utils.check_session_optimistically(controller)()
+
+        is_session_valid_mock.assert_called_with(common.SESSION_ID)
+        controller.assert_not_called()
+
+    @patch('ndopapp.utils.is_session_valid')
+    @patch('ndopapp.utils.render_template', return_value='session expired')
+    def test_check_session_concurrently_skips_prefetch_for_dead_session(self, render_mock, is_session_valid_mock):
+        self.app.config['CONCURRENT_SESSION_CHECK'] = True
+        prefetch = MagicMock()
+        controller = MagicMock()
+        utils.session_cache.put(common.SESSION_ID, False)
+
+        with self.app.test_request_context(headers={'Cookie': f'session_id_nojs={common.SESSION_ID}'}):
+            response = utils.check_session_concurrently(prefetch)(controller)()
+
+        self.assertEqual('session expired', response)
+        prefetch.assert_not_called()
+        is_session_valid_mock.assert_not_called()
+        controller.assert_not_called()
+
     def test_is_session_valid_when_session_is_none(self):
         self.assertFalse(utils.is_session_valid(None))
 
@@ -72,10 +162,8 @@ class TestUtils(unittest.TestCase):
             "arn:aws:lambda:eu-west-2:999999999999:function:ndop-build10-get-state-model"
         )
 
-    @patch('ndopapp.utils.app')
-    @patch('ndopapp.utils.json.loads')
-    @patch('ndopapp.utils.boto3.client')
-    def test_aws_lambda_invoke_return_payload_not_none(self, boto_mock, json_loads_mock, _):
+    @patch('ndopapp.statemodel.boto3')
+    def test_aws_lambda_invoke_return_payload_not_none(self, boto_mock):
 
         session_id = '111111'
         data = json.dumps({'session_id' : session_id})
@@ -84,15 +172,15 @@ class TestUtils(unittest.TestCase):
         payload_mock.read.return_value = json.dumps(
             {'session_id': session_id, 'contact_centre': True})
 
-        boto_mock('lambda').invoke.return_value = {'StatusCode': 200, 'Payload': payload_mock}
+        boto_mock.session.Session().client().invoke.return_value = {'StatusCode': 200, 'Payload': payload_mock}
 
-        payload = utils.aws_lambda_invoke('get-state-model', data=data)
+        with self.app.app_context():
+            payload = utils.aws_lambda_invoke('get-state-model', data=data)
         assert payload is not None
         assert payload.get('session_id') is not None
 
-    @patch('ndopapp.utils.app')
-    @patch('ndopapp.utils.boto3.client')
-    def test_aws_lambda_invoke_return_payload_is_none(self, boto_mock, _):
+    @patch('ndopapp.statemodel.boto3')
+    def test_aws_lambda_invoke_return_payload_is_none(self, boto_mock):
 
         session_id = '111111'
         data = json.dumps({'session_id' : session_id})
@@ -101,25 +189,26 @@ class TestUtils(unittest.TestCase):
         payload_mock.read.return_value = json.dumps(
             {'session_id': session_id, 'contact_centre': True})
 
-        boto_mock('lambda').invoke.return_value = {'StatusCode': 401, 'Payload': payload_mock}
+        boto_mock.session.Session().client().invoke.return_value = {'StatusCode': 401, 'Payload': payload_mock}
 
-        payload = utils.aws_lambda_invoke('get-state-model', data=data)
+        with self.app.app_context():
+            payload = utils.aws_lambda_invoke('get-state-model', data=data)
         assert payload is None
 
     @patch('ndopapp.utils.request')
-    @patch('ndopapp.utils.aws_lambda_invoke')
+    @patch('ndopapp.utils.state_model')
     def test_aws_get_state_model_invoke_aws_lambda_invoke(self, invoke_mock, request_mock):
 
         request_mock.cookies.get.return_value = '111111'
 
         utils.aws_lambda_get_state_model()
-        invoke_mock.assert_called()
+        invoke_mock.get.assert_called_with('111111')
 
-    @patch('ndopapp.utils.aws_lambda_invoke')
+    @patch('ndopapp.utils.state_model')
     def test_aws_put_state_model_invoke_aws_lambda_invoke(self, invoke_mock):
 
         utils.aws_lambda_put_state_model(state_model_json=None)
-        invoke_mock.assert_called()
+        invoke_mock.put.assert_called_with(None)
 
     @patch('ndopapp.utils.app')
     @patch('ndopapp.utils.request')
@@ -143,21 +232,23 @@ class TestUtils(unittest.TestCase):
         assert 'expiry_time_key' in clean_state_model
 
     @patch('ndopapp.utils.app')
+    @patch('ndopapp.utils.aws_lambda_reset_state_model', return_value=False)
     @patch('ndopapp.utils.aws_lambda_get_state_model')
     @patch('ndopapp.utils.aws_lambda_put_state_model')
     def test_aws_lambda_invoke_does_not_call_put_state_model_when_get_state_model_returns_none(self,
-        put_state_model_mock, get_state_model_mock, _):
+        put_state_model_mock, get_state_model_mock, *_):
 
         get_state_model_mock.return_value = None
         utils.clean_state_model()
         put_state_model_mock.assert_not_called()
 
     @patch('ndopapp.utils.app')
+    @patch('ndopapp.utils.aws_lambda_reset_state_model', return_value=False)
     @patch('ndopapp.utils.aws_lambda_get_state_model')
     @patch('ndopapp.utils.aws_lambda_put_state_model')
     @patch('ndopapp.utils.clean_state_model_locally')
     def test_aws_lambda_invoke_calls_put_state_model_when_get_state_model_returns_not_none(self,
-        clean_state_model_mock, put_state_model_mock, get_state_model_mock, _):
+        clean_state_model_mock, put_state_model_mock, get_state_model_mock, *_):
 
         clear_state_model = json.dumps({})
         get_state_model_mock.return_value = json.dumps({})
@@ -165,6 +256,16 @@ class TestUtils(unittest.TestCase):
         utils.clean_state_model()
         put_state_model_mock.assert_called_with(clear_state_model)
 
+    @patch('ndopapp.utils.aws_lambda_reset_state_model', return_value=True)
+    @patch('ndopapp.utils.aws_lambda_get_state_model')
+    @patch('ndopapp.utils.aws_lambda_put_state_model')
+    def test_clean_state_model_resets_in_one_call_when_supported(self,
+        put_state_model_mock, get_state_model_mock, _):
+
+        self.assertTrue(utils.clean_state_model())
+        get_state_model_mock.assert_not_called()
+        put_state_model_mock.assert_not_called()
+
     def test_ensure_leading_slash(self):
 
         ret = config.ensure_leading_slash('error.html')
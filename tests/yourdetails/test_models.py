@@ -299,6 +299,28 @@ class YourDetailsModelsTests(unittest.TestCase):
             "postcode": ""
         }), 'some session id'), PDS_RESULT_INVALID_AGE)
 
+    @patch('ndopapp.utils.aws_lambda_reset_state_model', return_value=False)
+    @patch('ndopapp.utils.aws_lambda_get_state_model', return_value={'flow': 'nhs_number'})
+    @patch('ndopapp.utils.aws_lambda_put_state_model')
+    def test_do_pds_search_waits_for_state_model_write(self, put_state_model_mock, *_):
+        """The cleaned state model is written before the PDS search is posted"""
+        with requests_mock.Mocker() as mock, self.app.test_request_context():
+            mock.post(self.app.config['PDS_SEARCH_URL'],
+                      additional_matcher=lambda _: put_state_model_mock.called, text='{}')
+
+            models.do_pds_search(type("user_details", (object, ), {
+                "firstName": "Joan",
+                "lastName": "Smith",
+                "dateOfBirthDay": 1,
+                "dateOfBirthMonth": 1,
+                "dateOfBirthYear": 1980,
+                "nhsNumber": "11111111111",
+                "postcode": ""
+            }), common.SESSION_ID)
+
+            self.assertEqual(1, mock.call_count)
+        put_state_model_mock.assert_called_once()
+
     def test_dob_string_returns_no_padded_numbers(self):
         sut = models.UserDetails()
         sut.dateOfBirthDay = ' 1'
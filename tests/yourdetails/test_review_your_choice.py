@@ -68,6 +68,22 @@ class YourDetailsReviewYourChoiceTests(unittest.TestCase):
         choice = doc.find(id='choice').text.strip()
         assert choice == expected_choice
 
+    @requests_mock.Mocker(kw='mock')
+    def test_review_your_choice_checks_session_concurrently(self, **kwargs):
+        self.app.config['CONCURRENT_SESSION_CHECK'] = True
+        mock = kwargs['mock']
+        check_session = mock.get(self.app.config['CHECK_SESSION_URL'], text=json.dumps({'valid': True}))
+        delivery_method = mock.get(self.app.config['GET_CONFIRMATION_DELIVERY_METHOD'],
+                                   text=confirmation_delivery_method_callback)
+        common.update_session_data(self.client, common.get_user_details())
+        self.client.set_cookie("test", 'session_id_nojs', common.SESSION_ID)
+
+        result = self.client.get(routes.get_raw('yourdetails.review_your_choice'))
+
+        assert HTTPStatus(result.status_code) == HTTPStatus.OK
+        assert check_session.call_count == 1
+        assert delivery_method.call_count == 1
+
     @patch('ndopapp.yourdetails.controllers.get_confirmation_delivery_details', return_value=None)
     @patch('ndopapp.yourdetails.controllers.redirect_to_route')
     def test_review_your_choice_redirects_to_generic_error_when_get_confirmation_delivery_details_returns_none(self, redirect_mock, _):
@@ -1,7 +1,13 @@
+import json
 import unittest
 from flask import Flask
-from unittest.mock import patch
+from unittest.mock import patch, ANY
+
+import requests_mock
+
+from ndopapp import create_app
 from ndopapp.yourdetails.controllers import store_preference_result, routes
+from tests import common
 
 class YourDetailsStorePreferenceResultTests(unittest.TestCase):
     
@@ -27,7 +33,7 @@ class YourDetailsStorePreferenceResultTests(unittest.TestCase):
     @patch('ndopapp.yourdetails.controllers.get_store_preference_result', return_value='failure')
     @patch('ndopapp.yourdetails.controllers.redirect_to_route')
     def test_preference_result_when_store_preferences_is_failed(self, redirect_mock, _, session):
-        session.get.return_value = 9999999999999999999999999999999999999999999
+        session.get.side_effect = {'timeout_threshold': 9999999999999999999999999999999999999999999}.get
 
         with Flask(__name__).app_context():
             store_preference_result.__wrapped__('some session id')
@@ -36,9 +42,36 @@ class YourDetailsStorePreferenceResultTests(unittest.TestCase):
         session.pop.assert_called()
 
     @patch('ndopapp.yourdetails.controllers.get_store_preference_result', return_value='not_completed')
-    @patch('ndopapp.yourdetails.controllers.render_template')
+    @patch('ndopapp.yourdetails.controllers.page_cache.render')
     def test_preference_result_when_store_preferences_is_not_completed_yet(self, render_template_mock, _):
         with Flask(__name__).app_context():
             store_preference_result.__wrapped__('some session id')
 
-        render_template_mock.assert_called_with('waiting-for-results.html', waiting_message='Saving your choice', routes=routes)
+        render_template_mock.assert_called_with('waiting-for-results.html', waiting_message='Saving your choice',
+                                                refresh_interval=ANY, routes=routes)
+
+
+class StorePreferenceResultLongPollTests(unittest.TestCase):
+    """ Test store_preference_result polling the backend in process"""
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config.update(LONG_POLL_TIMEOUT=0.3, LONG_POLL_INTERVAL=0.01, LONG_POLL_MAX_INTERVAL=0.08)
+        self.client = self.app.test_client()
+        self.client.set_cookie("test", "session_id_nojs", common.SESSION_ID)
+
+    @requests_mock.Mocker(kw='mock')
+    def test_result_waited_for_in_one_request(self, **kwargs):
+        """ Test a preference stored after a few polls is redirected to without a refresh"""
+        mock = kwargs['mock']
+        mock.get(self.app.config['CHECK_SESSION_URL'], text=json.dumps({'valid': True}))
+        poll = mock.get(self.app.config['SET_PREFERENCE_RESULT_URL'], [
+            {'status_code': 206},
+            {'status_code': 206},
+            {'status_code': 200},
+        ])
+
+        response = self.client.get(routes.get_raw("yourdetails.store_preference_result"))
+
+        self.assertIn(routes.get_raw("yourdetails.thank_you"), response.headers['Location'])
+        self.assertEqual(3, poll.call_count)
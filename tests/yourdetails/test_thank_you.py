@@ -65,8 +65,9 @@ class YourDetailsTestThankYouTests(unittest.TestCase):
 
     @patch('ndopapp.yourdetails.controllers.render_template')
     @patch('ndopapp.yourdetails.controllers.make_response')
+    @patch('ndopapp.yourdetails.controllers.request')
     @patch('ndopapp.yourdetails.controllers.session')
-    def test_thank_you_clears_session(self, session_mock, _, __):
+    def test_thank_you_clears_session(self, session_mock, *_):
         def get_mock(key):
             if key == 'is_successfully_stored':
                 return True
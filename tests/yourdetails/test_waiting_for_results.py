@@ -1,5 +1,9 @@
+import json
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, ANY
+
+import requests_mock
+
 from ndopapp import routes, create_app
 
 from tests import common
@@ -54,7 +58,7 @@ class YourDetailsWaitingForResultsTests(unittest.TestCase):
         redirect_mock.assert_called_with("main.generic_error")
 
     @patch('ndopapp.utils.is_session_valid', return_value=True)
-    @patch('ndopapp.yourdetails.controllers.render_template')
+    @patch('ndopapp.yourdetails.controllers.page_cache.render')
     @patch('ndopapp.yourdetails.controllers.check_status_of_pds_search_result')
     def test_rerender_waiting_for_results(self, 
             check_status_of_pds_search_result_mock, render_mock, _):
@@ -66,7 +70,7 @@ class YourDetailsWaitingForResultsTests(unittest.TestCase):
         self.client.get(routes.get_raw("verification.waiting_for_results"))
 
         render_mock.assert_called_with('waiting-for-results.html',
-                waiting_message=constants.PDS_SEARCH_WAITING_MESSAGE, routes=routes)
+                waiting_message=constants.PDS_SEARCH_WAITING_MESSAGE, refresh_interval=ANY, routes=routes)
 
     @patch('ndopapp.utils.is_session_valid', return_value=True)
     @patch('ndopapp.yourdetails.controllers.redirect_to_route')
@@ -119,5 +123,111 @@ class YourDetailsWaitingForResultsTests(unittest.TestCase):
         redirect_mock.assert_called_with("verification.verification_option")
 
 
+
+class WaitingForResultsConcurrentSessionCheckTests(unittest.TestCase):
+    """ Test waiting_for_results with the session check and first poll made at once"""
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config['CONCURRENT_SESSION_CHECK'] = True
+        self.client = self.app.test_client()
+        self.client.set_cookie("test", "session_id_nojs", common.SESSION_ID)
+
+    def tearDown(self):
+        self.client = None
+        self.app = None
+
+    def get_page(self, mock, valid, **search_result):
+        check_session = mock.get(self.app.config['CHECK_SESSION_URL'], text=json.dumps({'valid': valid}))
+        poll = mock.get(self.app.config['PDS_SEARCH_RESULT_URL'], **search_result)
+        response = self.client.get(routes.get_raw("verification.waiting_for_results"))
+        return response, check_session, poll
+
+    @requests_mock.Mocker(kw='mock')
+    def test_poll_made_with_session_check(self, **kwargs):
+        """ Test the first poll is made alongside the session check and its result used"""
+        response, check_session, poll = self.get_page(kwargs['mock'], True, text=json.dumps({'search_result': 'success'}))
+
+        self.assertIn(routes.get_raw("verification.verification_option"), response.headers['Location'])
+        self.assertEqual(1, check_session.call_count)
+        self.assertEqual(1, poll.call_count)
+
+    @requests_mock.Mocker(kw='mock')
+    def test_expired_session_poll_failure_not_logged(self, **kwargs):
+        """ Test an expired session serves the session expired page without logging the rejected poll"""
+        with patch.object(self.app.logger, 'error') as error_mock:
+            response, _, poll = self.get_page(kwargs['mock'], False, status_code=403)
+
+        self.assertIn(b"you'll need to start again", response.data)
+        self.assertEqual(1, poll.call_count)
+        error_mock.assert_not_called()
+
+    @requests_mock.Mocker(kw='mock')
+    def test_poll_failure_logged_for_valid_session(self, **kwargs):
+        """ Test a poll failing for a valid session is logged once the session check has passed"""
+        common.registerExceptionHandlers(self.app)
+        with patch.object(self.app.logger, 'error') as error_mock:
+            self.get_page(kwargs['mock'], True, status_code=500)
+
+        self.assertIn('HTTPError', [args[1].get('exception_type') for args, _ in error_mock.call_args_list])
+
+    @requests_mock.Mocker(kw='mock')
+    def test_no_poll_once_timed_out(self, **kwargs):
+        """ Test a journey past its timeout only has its session checked"""
+        with self.client.session_transaction() as session:
+            session['timeout_threshold'] = 1
+
+        response, check_session, poll = self.get_page(kwargs['mock'], True, text='{}')
+
+        self.assertIn(routes.get_raw("main.generic_error"), response.headers['Location'])
+        self.assertEqual(1, check_session.call_count)
+        self.assertEqual(0, poll.call_count)
+
+
+
+class WaitingForResultsLongPollTests(unittest.TestCase):
+    """ Test waiting_for_results polling the backend in process"""
+
+    def setUp(self):
+        self.app = create_app('ndopapp.config.TestConfig')
+        self.app.config.update(LONG_POLL_TIMEOUT=0.3, LONG_POLL_INTERVAL=0.01, LONG_POLL_MAX_INTERVAL=0.08)
+        self.client = self.app.test_client()
+        self.client.set_cookie("test", "session_id_nojs", common.SESSION_ID)
+
+    def tearDown(self):
+        self.client = None
+        self.app = None
+
+    @requests_mock.Mocker(kw='mock')
+    def test_result_waited_for_in_one_request(self, **kwargs):
+        """ Test a result ready after a few polls is redirected to without a refresh"""
+        mock = kwargs['mock']
+        mock.get(self.app.config['CHECK_SESSION_URL'], text=json.dumps({'valid': True}))
+        poll = mock.get(self.app.config['PDS_SEARCH_RESULT_URL'], [
+            {'text': json.dumps({'search_result': 'incomplete'})},
+            {'text': json.dumps({'search_result': 'incomplete'})},
+            {'text': json.dumps({'search_result': 'success'})},
+        ])
+
+        response = self.client.get(routes.get_raw("verification.waiting_for_results"))
+
+        self.assertIn(routes.get_raw("verification.verification_option"), response.headers['Location'])
+        self.assertEqual(3, poll.call_count)
+
+    @requests_mock.Mocker(kw='mock')
+    def test_slow_result_polled_with_backoff(self, **kwargs):
+        """ Test a result that isn't ready is polled less and less often before the waiting page is served"""
+        mock = kwargs['mock']
+        mock.get(self.app.config['CHECK_SESSION_URL'], text=json.dumps({'valid': True}))
+        poll = mock.get(self.app.config['PDS_SEARCH_RESULT_URL'], text=json.dumps({'search_result': 'incomplete'}))
+
+        response = self.client.get(routes.get_raw("verification.waiting_for_results"))
+
+        self.assertIn(b'http-equiv="refresh"', response.data)
+        # 0.01 + 0.02 + 0.04 + 0.08 + 0.08 + 0.08 seconds of waits fit in the 0.3 second timeout
+        self.assertLessEqual(poll.call_count, 7)
+        self.assertGreater(poll.call_count, 1)
+
+
 if __name__ == '__main__':
     unittest.main()